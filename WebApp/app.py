@@ -7,6 +7,7 @@ import tempfile
 import asyncio
 import speech_recognition as sr
 import edge_tts
+from pydub import AudioSegment
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
@@ -17,6 +18,7 @@ GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 GOOGLE_MODEL = os.getenv("GOOGLE_MODEL", "gemini-1.5-flash")
 TTS_VOICE = "en-IN-NeerjaNeural"
+OPUS_BITRATE_KBPS = int(os.getenv("TTS_OPUS_BITRATE_KBPS", "24"))
 
 SYSTEM_PROMPT = """You are Sudip. Full name Sudip Das.
 
@@ -130,7 +132,7 @@ def generate(message):
 
 
 # ============ TTS (Edge TTS) ============
-def synthesize(text):
+def synthesize(text, output_format="mp3"):
     if not text:
         return None
     
@@ -140,11 +142,19 @@ def synthesize(text):
         await communicate.save(temp.name)
         return temp.name
     
-    return asyncio.run(_synthesize())
+    path = asyncio.run(_synthesize())
+    if output_format != "opus":
+        return path
+    
+    # Low-bitrate Opus (in Ogg) for slow mobile links
+    opus_path = path[:-4] + ".ogg"
+    AudioSegment.from_file(path).export(opus_path, format="ogg", codec="libopus", bitrate=f"{OPUS_BITRATE_KBPS}k")
+    os.unlink(path)
+    return opus_path
 
 
 # ============ Main Pipeline ============
-def process_voice(audio_path):
+def process_voice(audio_path, output_format="mp3"):
     if not audio_path:
         return None, "No audio recorded"
     
@@ -157,13 +167,13 @@ def process_voice(audio_path):
     bot_response = generate(user_text)
     
     # TTS
-    audio_file = synthesize(bot_response)
+    audio_file = synthesize(bot_response, output_format)
     
     chat_text = f"You: {user_text}\nBot: {bot_response}"
     return audio_file, chat_text
 
 
-def process_text(text):
+def process_text(text, output_format="mp3"):
     if not text or not text.strip():
         return None, "Please enter a message"
     
@@ -171,7 +181,7 @@ def process_text(text):
     bot_response = generate(text.strip())
     
     # TTS
-    audio_file = synthesize(bot_response)
+    audio_file = synthesize(bot_response, output_format)
     
     chat_text = f"You: {text}\nBot: {bot_response}"
     return audio_file, chat_text
@@ -189,13 +199,20 @@ with gr.Blocks(title="VoiceGraph", theme=gr.themes.Soft()) as app:
     gr.Markdown("# 🎙️ VoiceGraph")
     gr.Markdown("*Voice assistant powered by Whisper + Groq + Edge TTS*")
     
+    output_format = gr.Radio(
+        choices=["mp3", "opus"],
+        value="mp3",
+        label="Output Format (opus for slow connections)",
+        interactive=True
+    )
+    
     with gr.Tab("🎤 Voice"):
         audio_input = gr.Audio(sources=["microphone"], type="filepath", label="Record")
         voice_btn = gr.Button("Send", variant="primary")
         audio_output = gr.Audio(label="Response", autoplay=True)
         voice_text = gr.Textbox(label="Chat", lines=3)
         
-        voice_btn.click(process_voice, [audio_input], [audio_output, voice_text])
+        voice_btn.click(process_voice, [audio_input, output_format], [audio_output, voice_text])
     
     with gr.Tab("⌨️ Text"):
         text_input = gr.Textbox(label="Message", placeholder="Type here...")
@@ -203,8 +220,8 @@ with gr.Blocks(title="VoiceGraph", theme=gr.themes.Soft()) as app:
         text_audio = gr.Audio(label="Response", autoplay=True)
         text_display = gr.Textbox(label="Chat", lines=3)
         
-        text_btn.click(process_text, [text_input], [text_audio, text_display])
-        text_input.submit(process_text, [text_input], [text_audio, text_display])
+        text_btn.click(process_text, [text_input, output_format], [text_audio, text_display])
+        text_input.submit(process_text, [text_input, output_format], [text_audio, text_display])
     
     clear_btn = gr.Button("Clear Chat")
     clear_status = gr.Markdown("")
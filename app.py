@@ -1,7 +1,9 @@
 import os
+import base64
 import gradio as gr
 import requests
 import tempfile
+import uuid
 
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
@@ -15,45 +17,42 @@ def check_api():
         return False
 
 
-def send_audio_to_api(audio_path, output_format="mp3"):
+def save_audio_response(data, output_format):
+    # Opus comes in an Ogg container; browsers pick it up by the .ogg suffix
+    suffix = "ogg" if output_format == "opus" else output_format
+    temp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{suffix}")
+    temp.write(base64.b64decode(data["audio_base64"]))
+    temp.close()
+    return temp.name
+
+
+def send_audio_to_api(audio_path, output_format="mp3", session_id="default"):
     if not audio_path:
         return None, "No audio recorded"
     
     try:
-        # First get the text response
+        # One request returns transcript, reply text and audio together
         with open(audio_path, "rb") as f:
-            text_resp = requests.post(
-                f"{API_URL}/api/voice/process-with-text",
+            resp = requests.post(
+                f"{API_URL}/api/voice/process-full",
                 files={"audio": ("audio.wav", f, "audio/wav")},
-                data={"output_format": output_format},
+                data={"output_format": output_format, "session_id": session_id},
                 timeout=120
             )
         
-        if text_resp.status_code != 200:
-            error = text_resp.json().get("detail", "Unknown error")
+        if resp.status_code != 200:
+            error = resp.json().get("detail", "Unknown error")
             return None, f"Error: {error}"
         
-        text_data = text_resp.json()
-        user_text = text_data.get("transcribed_text", "")
-        bot_text = text_data.get("response_text", "")
+        data = resp.json()
+        user_text = data.get("transcribed_text") or ""
+        bot_text = data.get("response_text") or ""
         
-        # Now get the audio response
-        with open(audio_path, "rb") as f:
-            audio_resp = requests.post(
-                f"{API_URL}/api/voice/process",
-                files={"audio": ("audio.wav", f, "audio/wav")},
-                data={"output_format": output_format},
-                timeout=120
-            )
-        
-        if audio_resp.status_code == 200:
-            temp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{output_format}")
-            temp.write(audio_resp.content)
-            temp.close()
+        if data.get("audio_base64"):
             chat_text = f"You: {user_text}\nBot: {bot_text}"
-            return temp.name, chat_text
+            return save_audio_response(data, output_format), chat_text
         else:
-            return None, f"Error getting audio"
+            return None, f"Error: {data.get('error') or 'Error getting audio'}"
             
     except requests.exceptions.ConnectionError:
         return None, "Cannot connect to API. Is the backend running?"
@@ -61,38 +60,29 @@ def send_audio_to_api(audio_path, output_format="mp3"):
         return None, f"Error: {str(e)}"
 
 
-def send_text_to_api(text, output_format="mp3"):
+def send_text_to_api(text, output_format="mp3", session_id="default"):
     if not text or not text.strip():
         return None, "Please enter a message"
     
     try:
-        # Get text response first
-        text_resp = requests.post(
-            f"{API_URL}/api/text/chat-text",
-            json={"text": text.strip()},
+        resp = requests.post(
+            f"{API_URL}/api/text/chat-full",
+            json={"text": text.strip(), "output_format": output_format, "session_id": session_id},
             timeout=120
         )
         
-        bot_text = ""
-        if text_resp.status_code == 200:
-            bot_text = text_resp.json().get("response_text", "")
+        if resp.status_code != 200:
+            error = resp.json().get("detail", "Unknown error")
+            return None, f"Error: {error}"
         
-        # Get audio response
-        resp = requests.post(
-            f"{API_URL}/api/text/chat",
-            json={"text": text.strip(), "output_format": output_format},
-            timeout=120
-        )
+        data = resp.json()
+        bot_text = data.get("response_text") or ""
         
-        if resp.status_code == 200:
-            temp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{output_format}")
-            temp.write(resp.content)
-            temp.close()
+        if data.get("audio_base64"):
             chat_text = f"You: {text}\nBot: {bot_text}"
-            return temp.name, chat_text
+            return save_audio_response(data, output_format), chat_text
         else:
-            error = resp.json().get("detail", "Unknown error")
-            return None, f"Error: {error}"
+            return None, f"Error: {data.get('error') or 'Unknown error'}"
             
     except requests.exceptions.ConnectionError:
         return None, "Cannot connect to API. Is the backend running?"
@@ -100,9 +90,13 @@ def send_text_to_api(text, output_format="mp3"):
         return None, f"Error: {str(e)}"
 
 
-def clear_conversation():
+def clear_conversation(session_id="default"):
     try:
-        requests.post(f"{API_URL}/api/conversation/clear", timeout=3)
+        requests.post(
+            f"{API_URL}/api/conversation/clear",
+            params={"session_id": session_id},
+            timeout=3
+        )
         return None, None, "Conversation cleared!"
     except:
         return None, None, "Failed to clear conversation"
@@ -125,9 +119,12 @@ def create_app():
         status = "API Connected" if check_api() else "API Offline - Run: `python main.py`"
         gr.Markdown(f"**Status:** {status}")
         
+        # One conversation per browser session
+        session_id = gr.State(lambda: uuid.uuid4().hex)
+        
         # Output format selector
         output_format = gr.Radio(
-            choices=["mp3", "ogg", "wav"],
+            choices=["mp3", "ogg", "opus", "wav"],
             value="mp3",
             label="Output Format",
             interactive=True
@@ -164,7 +161,7 @@ def create_app():
             # Wire up voice chat
             voice_submit.click(
                 fn=send_audio_to_api,
-                inputs=[audio_input, output_format],
+                inputs=[audio_input, output_format, session_id],
                 outputs=[audio_output, voice_chat_display]
             )
         
@@ -195,14 +192,14 @@ def create_app():
             # Wire up text chat
             text_submit.click(
                 fn=send_text_to_api,
-                inputs=[text_input, output_format],
+                inputs=[text_input, output_format, session_id],
                 outputs=[text_audio_output, text_chat_display]
             )
             
             # Also allow Enter key to submit
             text_input.submit(
                 fn=send_text_to_api,
-                inputs=[text_input, output_format],
+                inputs=[text_input, output_format, session_id],
                 outputs=[text_audio_output, text_chat_display]
             )
         
@@ -213,6 +210,7 @@ def create_app():
         
         clear_btn.click(
             fn=clear_conversation,
+            inputs=[session_id],
             outputs=[audio_output, text_audio_output, clear_status]
         )
         
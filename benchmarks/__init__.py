@@ -0,0 +1 @@
+"""Local benchmarks and stand-in servers."""
@@ -0,0 +1,350 @@
+"""Offline end-to-end benchmark: latency per stage, throughput and memory.
+
+Starts the local Groq and Edge TTS stand-ins (fake_groq, fake_edge), points
+the app at them and drives four scenarios at the given concurrency:
+
+- process_audio   orchestrator.process_audio on the benchmark clips
+- process_text    orchestrator.process_text on the clip transcripts
+- http_voice      POST /api/voice/process (uvicorn on a local port)
+- http_text       POST /api/text/chat
+
+For each scenario the JSON report has end-to-end and per-stage (stt, llm,
+tts) p50/p95/p99, throughput, errors and RSS (this process and the STT
+workers). Uses the rendered clips in benchmarks/clips if present, else
+offline synthetic ones (see make_clips --synthetic). STT runs the
+configured local engine, or with --stt fake a stand-in that sleeps for
+--fake-stt-rtf x the clip length. TTS and answer caches are off unless
+--cache is given, since the stand-ins return the same reply every time.
+Run from the repo root:
+    python -m benchmarks.e2e --requests 40 --concurrency 4 --output e2e.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+from benchmarks.fake_edge import FakeEdgeServer, use_fake_edge
+from benchmarks.fake_groq import FakeGroqServer
+from benchmarks.make_clips import CLIPS_DIR, load_manifest, run_synthetic
+from config import settings
+
+SCENARIOS = ["process_audio", "process_text", "http_voice", "http_text"]
+
+# (module attribute, stage) pairs timed on every call
+STAGES = [
+    ("stt", "transcribe", "stt"),
+    ("llm", "generate", "llm"),
+    ("tts", "synthesize", "tts"),
+    ("tts", "synthesize_stream", "tts"),
+]
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ms = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(ms.mean()), 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1)
+    }
+
+
+def rss_mb(pid="self") -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class MemorySampler:
+    """Peak RSS of this process and of the STT worker processes."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak = 0.0
+        self.peak_workers = 0.0
+        self._task = None
+
+    def _sample(self):
+        self.peak = max(self.peak, rss_mb())
+        workers = sum(rss_mb(child.pid) for child in multiprocessing.active_children())
+        self.peak_workers = max(self.peak_workers, workers)
+
+    async def _run(self):
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak = self.peak_workers = 0.0
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> dict:
+        self._task.cancel()
+        self._sample()
+        return {"rss_mb": round(rss_mb(), 1), "peak_rss_mb": round(self.peak, 1), "peak_stt_workers_rss_mb": round(self.peak_workers, 1)}
+
+
+class StageRecorder:
+    """Wraps the stage entry points so every call's duration is recorded."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def install(self):
+        from modules import stt, llm, tts
+        modules = {"stt": stt, "llm": llm, "tts": tts}
+        for module_name, attribute, stage in STAGES:
+            module = modules[module_name]
+            original = getattr(module, attribute)
+            wrapper = self._wrap_stream if attribute == "synthesize_stream" else self._wrap
+            setattr(module, attribute, wrapper(original, stage))
+
+    def _wrap(self, original, stage: str):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def _wrap_stream(self, original, stage: str):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                async for chunk in original(*args, **kwargs):
+                    yield chunk
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def reset(self):
+        self.samples = defaultdict(list)
+
+
+def load_clips(clips_dir: str) -> tuple:
+    """([(name, wav bytes, seconds, transcript)], source)."""
+    manifest = load_manifest(clips_dir)
+    source = "rendered"
+    directory = clips_dir
+    if not all(os.path.exists(os.path.join(clips_dir, clip["file"])) for clip in manifest):
+        source = "synthetic"
+        directory = run_synthetic(clips_dir, force=False)
+
+    clips = []
+    for clip in manifest:
+        with open(os.path.join(directory, clip["file"]), "rb") as f:
+            data = f.read()
+        clips.append((clip["file"], data, sf.info(io.BytesIO(data)).duration, clip["text"]))
+    return clips, source
+
+
+def use_fake_stt(rtf: float):
+    from modules import stt
+
+    async def transcribe(engine_name: str, audio):
+        await asyncio.sleep(len(audio) / 16000 * rtf)
+        return "Tell me a little about yourself.", 0.9
+
+    stt.transcribe_with_engine = transcribe
+
+
+def configure(groq_url: str, edge_url: str, args):
+    settings.groq_base_url = groq_url
+    settings.groq_api_key = "fake"
+    settings.groq_backup_base_url = ""
+    settings.google_api_key = ""
+    settings.llm_providers = "groq"
+    settings.stt_fallback_engines = ""
+    if not args.cache:
+        settings.tts_cache_memory_mb = 0
+        settings.tts_cache_dir = ""
+        settings.answer_cache_enabled = False
+    use_fake_edge(edge_url)
+    if args.stt == "fake":
+        use_fake_stt(args.fake_stt_rtf)
+
+
+async def start_http() -> tuple:
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+def make_request(scenario: str, clip: tuple, client: httpx.AsyncClient):
+    from modules import orchestrator
+    name, data, _, text = clip
+    session_id = uuid.uuid4().hex
+
+    async def process_audio():
+        result = await orchestrator.process_audio(data, "wav", "mp3", session_id)
+        return result["success"]
+
+    async def process_text():
+        result = await orchestrator.process_text(text, "mp3", session_id)
+        return result["success"]
+
+    async def http_voice():
+        files = {"audio": (name, data, "audio/wav")}
+        response = await client.post("/api/voice/process", files=files, data={"output_format": "mp3", "session_id": session_id})
+        return response.status_code == 200 and len(response.content) > 0
+
+    async def http_text():
+        response = await client.post("/api/text/chat", json={"text": text, "output_format": "mp3", "session_id": session_id})
+        return response.status_code == 200 and len(response.content) > 0
+
+    return {"process_audio": process_audio, "process_text": process_text, "http_voice": http_voice, "http_text": http_text}[scenario]
+
+
+async def run_scenario(scenario: str, clips: list, args, recorder: StageRecorder, client: httpx.AsyncClient) -> dict:
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(clips[i % len(clips)])
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            request = make_request(scenario, queue.get_nowait(), client)
+            start = time.perf_counter()
+            try:
+                ok = await request()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    recorder.reset()
+    memory = MemorySampler()
+    memory.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "end_to_end": percentiles(latencies),
+        "stages": {stage: percentiles(values) for stage, values in sorted(recorder.samples.items())},
+        "memory": memory.stop()
+    }
+
+
+async def run(args) -> dict:
+    groq = FakeGroqServer(first_token_delay=args.llm_first_token_delay, tokens_per_second=args.llm_tokens_per_second)
+    edge = FakeEdgeServer(first_chunk_delay=args.tts_first_chunk_delay, realtime_factor=args.tts_realtime_factor)
+    configure(await groq.start(), await edge.start(), args)
+
+    from modules import orchestrator, stt
+    recorder = StageRecorder()
+    recorder.install()
+    clips, clip_source = load_clips(args.clips)
+
+    # Model load and first inference aren't part of the measurement
+    warm_start = time.perf_counter()
+    if args.stt == "engine":
+        await stt.warm_up()
+    warm_up_seconds = time.perf_counter() - warm_start
+
+    server, server_task, base_url = await start_http()
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "stt": settings.stt_engine if args.stt == "engine" else f"fake (rtf {args.fake_stt_rtf})",
+            "stt_workers": settings.stt_workers,
+            "clips": clip_source,
+            "llm_first_token_delay": args.llm_first_token_delay,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+            "tts_first_chunk_delay": args.tts_first_chunk_delay,
+            "tts_realtime_factor": args.tts_realtime_factor,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count()
+        },
+        "stt_warm_up_seconds": round(warm_up_seconds, 2),
+        "scenarios": {}
+    }
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            for scenario in args.scenarios:
+                report["scenarios"][scenario] = await run_scenario(scenario, clips, args, recorder, client)
+                summary = report["scenarios"][scenario]
+                print(
+                    f"{scenario:<14} p50 {summary['end_to_end'].get('p50_ms', 0):>8.1f} ms  "
+                    f"p99 {summary['end_to_end'].get('p99_ms', 0):>8.1f} ms  "
+                    f"{summary['throughput_rps']:>6.2f} req/s  errors {summary['errors']}"
+                )
+    finally:
+        server.should_exit = True
+        await server_task
+        await orchestrator.cleanup()
+        await edge.stop()
+        await groq.stop()
+
+    report["stand_ins"] = {
+        "groq_requests": groq.requests,
+        "groq_connections": groq.connections,
+        "edge_requests": edge.requests,
+        "edge_connections": edge.connections
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--clips", default=CLIPS_DIR, help="Directory with manifest.json")
+    parser.add_argument("--stt", choices=["engine", "fake"], default="engine", help="Configured STT engine or a sleeping stand-in")
+    parser.add_argument("--fake-stt-rtf", type=float, default=0.1, help="Stand-in STT seconds per second of audio")
+    parser.add_argument("--llm-first-token-delay", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--tts-first-chunk-delay", type=float, default=0.15)
+    parser.add_argument("--tts-realtime-factor", type=float, default=8.0)
+    parser.add_argument("--cache", action="store_true", help="Leave the TTS and answer caches on")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    report = asyncio.run(run(args))
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(body)
+
+
+if __name__ == "__main__":
+    main()
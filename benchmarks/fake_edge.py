@@ -0,0 +1,115 @@
+"""Local stand-in for the Edge TTS WebSocket service.
+
+Speaks the subset of the protocol edge-tts uses (speech.config and ssml
+requests in, turn.start / audio / turn.end frames out) and streams canned
+24 kHz mp3 sized to the text, at a configurable real-time factor.
+Point edge-tts at it with ``use_fake_edge(url)``.
+"""
+import asyncio
+import functools
+import io
+import re
+import uuid
+
+import numpy as np
+import soundfile as sf
+from aiohttp import web, WSMsgType
+
+SAMPLE_RATE = 24000
+
+
+@functools.lru_cache(maxsize=64)
+def canned_mp3(seconds: float) -> bytes:
+    """A soft two-tone hum, so the audio is valid mp3 of the right length."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    samples = 0.1 * np.sin(2 * np.pi * 180 * t) + 0.05 * np.sin(2 * np.pi * 720 * t)
+    out = io.BytesIO()
+    # ~48 kbit/s CBR, like Edge's audio-24khz-48kbitrate-mono-mp3
+    sf.write(out, samples.astype(np.float32), SAMPLE_RATE, format="MP3", compression_level=0.75, bitrate_mode="CONSTANT")
+    return out.getvalue()
+
+
+def use_fake_edge(url: str):
+    """Make edge-tts connect to ``url`` (e.g. FakeEdgeServer.url) instead of Microsoft."""
+    import edge_tts.communicate
+    edge_tts.communicate.WSS_URL = f"{url}?TrustedClientToken=fake"
+
+
+def _text_frame(request_id: str, path: str, body: str = "{}") -> str:
+    return (
+        f"X-RequestId:{request_id}\r\n"
+        "Content-Type:application/json; charset=utf-8\r\n"
+        f"Path:{path}\r\n\r\n{body}"
+    )
+
+
+def _audio_frame(request_id: str, data: bytes) -> bytes:
+    headers = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+    return len(headers).to_bytes(2, "big") + headers + data
+
+
+class FakeEdgeServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        first_chunk_delay: float = 0.15,
+        realtime_factor: float = 8.0,
+        words_per_second: float = 2.5,
+        chunk_bytes: int = 4096
+    ):
+        self.host = host
+        self.port = port
+        self.first_chunk_delay = first_chunk_delay
+        # Seconds of audio produced per second of wall time
+        self.realtime_factor = realtime_factor
+        self.words_per_second = words_per_second
+        self.chunk_bytes = chunk_bytes
+        self.connections = 0
+        self.requests = 0
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/edge/v1"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/edge/v1", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        self.connections += 1
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type != WSMsgType.TEXT or "Path:ssml" not in message.data:
+                continue
+            self.requests += 1
+            await self._speak(ws, message.data)
+        return ws
+
+    async def _speak(self, ws: web.WebSocketResponse, ssml: str):
+        request_id = uuid.uuid4().hex
+        text = re.sub(r"<[^>]+>", " ", ssml.split("\r\n\r\n", 1)[-1])
+        seconds = max(0.5, round(len(text.split()) / self.words_per_second * 2) / 2)
+        audio = canned_mp3(seconds)
+
+        await ws.send_str(_text_frame(request_id, "turn.start"))
+        await asyncio.sleep(self.first_chunk_delay)
+        pace = self.chunk_bytes / (len(audio) / seconds) / self.realtime_factor
+        for offset in range(0, len(audio), self.chunk_bytes):
+            await ws.send_bytes(_audio_frame(request_id, audio[offset:offset + self.chunk_bytes]))
+            await asyncio.sleep(pace)
+        await ws.send_str(_text_frame(request_id, "turn.end"))
+
@@ -0,0 +1,173 @@
+"""Local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+Speaks just enough HTTP/1.1 (keep-alive, JSON and SSE streaming) for the
+Groq SDK, and counts TCP connections so pooling can be measured.
+"""
+import asyncio
+import json
+import random
+import time
+
+DEFAULT_REPLY = (
+    "I enjoy building practical machine learning projects. "
+    "Most of my work is in Python, and I like breaking problems into small steps. "
+    "I try to keep things simple and focus on real impact."
+)
+
+
+class FakeGroqServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        reply: str = DEFAULT_REPLY,
+        first_token_delay: float = 0.05,
+        tokens_per_second: float = 200.0,
+        slow_fraction: float = 0.0,
+        slow_delay: float = 2.0,
+        seed: int = 0
+    ):
+        self.host = host
+        self.port = port
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.tokens_per_second = tokens_per_second
+        # Injected tail latency: this fraction of requests waits slow_delay for the first token
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self._random = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+        self._writers = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            # Let the connection handlers see EOF before the loop shuts down
+            while self._writers:
+                await asyncio.sleep(0.01)
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.requests += 1
+                payload = json.loads(body or b"{}")
+                if payload.get("stream"):
+                    await self._stream(writer, payload)
+                else:
+                    await self._complete(writer, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _first_token_delay(self) -> float:
+        if self._random.random() < self.slow_fraction:
+            return self.slow_delay
+        return self.first_token_delay
+
+    def _tokens(self):
+        words = self.reply.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    async def _complete(self, writer, payload: dict):
+        tokens = self._tokens()
+        await asyncio.sleep(self._first_token_delay() + len(tokens) / self.tokens_per_second)
+        body = json.dumps({
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+        }).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer, payload: dict):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        await asyncio.sleep(self._first_token_delay())
+        for token in self._tokens():
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(1.0 / self.tokens_per_second)
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Share of requests with a slow first token")
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(
+        port=args.port,
+        first_token_delay=args.first_token_delay,
+        tokens_per_second=args.tokens_per_second,
+        slow_fraction=args.slow_fraction,
+        slow_delay=args.slow_delay
+    )
+    print(f"Fake Groq listening on {await server.start()} (set GROQ_BASE_URL to this)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""LLM reply latency with and without hedging, against two local stand-in servers.
+
+The primary stalls on a share of requests (injected tail latency); the backup
+is steady but a little slower. Run from the repo root:
+    python -m benchmarks.llm_hedging --requests 100 --slow-fraction 0.1
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from benchmarks.fake_groq import FakeGroqServer
+from config import settings
+from modules import llm
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run_mode(requests: int, hedge: bool) -> dict:
+    settings.llm_hedge_enabled = hedge
+    llm._hedge.update(requests=0, hedged=0, hedge_wins=0, failovers=0)
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await llm.generate("Tell me about yourself", uuid.uuid4().hex)
+        latencies.append(time.perf_counter() - start)
+    stats = llm.hedge_stats()
+    return {
+        "p50": statistics.median(latencies) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "hedge_rate": stats["hedge_rate"],
+        "hedge_wins": stats["hedge_wins"]
+    }
+
+
+async def run(args):
+    primary = FakeGroqServer(
+        first_token_delay=args.first_token_delay,
+        slow_fraction=args.slow_fraction,
+        slow_delay=args.slow_delay
+    )
+    backup = FakeGroqServer(first_token_delay=args.first_token_delay * 2, seed=1)
+    settings.groq_base_url = await primary.start()
+    settings.groq_backup_base_url = await backup.start()
+    settings.groq_api_key = settings.groq_api_key or "test"
+    settings.llm_providers = "groq,groq_backup"
+    settings.answer_cache_enabled = False
+
+    # Learn the primary's first-token distribution before measuring
+    settings.llm_hedge_enabled = False
+    for _ in range(30):
+        await llm.generate("warm-up", uuid.uuid4().hex)
+
+    print(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'hedged':>9}{'won':>6}")
+    for name, hedge in (("no hedge", False), ("hedged", True)):
+        r = await run_mode(args.requests, hedge)
+        print(f"{name:<10}{r['p50']:>9.0f}{r['p95']:>9.0f}{r['p99']:>9.0f}{r['hedge_rate']:>9.1%}{r['hedge_wins']:>6}")
+
+    await llm.close_clients()
+    await primary.stop()
+    await backup.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--slow-delay", type=float, default=1.5)
+    asyncio.run(run(parser.parse_args()))
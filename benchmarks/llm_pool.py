@@ -0,0 +1,54 @@
+"""Connection setups per request: pooled LLM client vs a new ChatGroq per call.
+
+Run from the repo root:  python -m benchmarks.llm_pool --requests 20
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_groq import ChatGroq
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_groq import FakeGroqServer
+from config import settings
+from modules import llm
+
+
+async def run(requests: int):
+    server = FakeGroqServer(first_token_delay=0.0, tokens_per_second=10000)
+    settings.groq_base_url = await server.start()
+    settings.groq_api_key = settings.groq_api_key or "test"
+    messages = [HumanMessage(content="Tell me about yourself")]
+
+    # Old behaviour: a fresh client (and connection pool) for every call
+    start = time.perf_counter()
+    for _ in range(requests):
+        client = ChatGroq(
+            api_key=settings.groq_api_key,
+            model=settings.groq_model,
+            temperature=0.7,
+            max_tokens=256,
+            base_url=settings.groq_base_url
+        )
+        await client.ainvoke(messages)
+    per_call = (server.connections, time.perf_counter() - start)
+
+    # Pooled registry client
+    server.connections = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        await llm.get_client().ainvoke(messages)
+    pooled = (server.connections, time.perf_counter() - start)
+
+    await llm.close_clients()
+    await server.stop()
+
+    print(f"{'mode':<10}{'connections':>12}{'conn/req':>10}{'ms/req':>10}")
+    for name, (connections, elapsed) in (("per-call", per_call), ("pooled", pooled)):
+        print(f"{name:<10}{connections:>12}{connections / requests:>10.2f}{elapsed / requests * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    asyncio.run(run(parser.parse_args().requests))
@@ -0,0 +1,90 @@
+"""Render the benchmark clip set in benchmarks/clips from its manifest.
+
+Each manifest entry has the reference transcript and an Edge TTS voice; the
+clips are written as 16 kHz mono WAV. Needs network access for Edge TTS.
+With --synthetic, speech-like stand-ins of the same length are rendered
+offline into benchmarks/clips/synthetic instead (no words, so no WER).
+Run from the repo root:
+    python -m benchmarks.make_clips
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+
+import numpy as np
+import soundfile as sf
+
+from modules.tts import synthesize_with_edge
+from utils.audio import ingest_audio
+
+CLIPS_DIR = os.path.join(os.path.dirname(__file__), "clips")
+SYNTHETIC_DIR = os.path.join(CLIPS_DIR, "synthetic")
+
+
+def load_manifest(clips_dir: str = CLIPS_DIR) -> list:
+    with open(os.path.join(clips_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def babble(text: str, seed: int = 0, sample_rate: int = 16000) -> np.ndarray:
+    """Speech-like audio for ``text``: one voiced syllable (harmonics of a
+    drifting pitch, weighted by two formants) per vowel group, short gaps
+    between words and half a second of silence at each end."""
+    rng = np.random.default_rng(seed)
+    pitch = rng.uniform(100, 220)
+    parts = [np.zeros(sample_rate // 2, dtype=np.float32)]
+    for word in text.split():
+        for _ in range(max(1, len(re.findall(r"[aeiouy]+", word.lower())))):
+            length = int(rng.uniform(0.12, 0.22) * sample_rate)
+            t = np.arange(length) / sample_rate
+            f0 = pitch * (1 + 0.05 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+            phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+            formants = rng.uniform(300, 900), rng.uniform(900, 2500)
+            syllable = np.zeros(length)
+            for harmonic in range(1, 30):
+                frequency = harmonic * pitch
+                weight = sum(np.exp(-((frequency - f) / 150) ** 2) for f in formants) + 0.05 / harmonic
+                syllable += weight * np.sin(harmonic * phase)
+            envelope = np.sin(np.pi * np.arange(length) / length) ** 0.5
+            parts.append((0.15 * syllable / np.abs(syllable).max() * envelope).astype(np.float32))
+        parts.append(np.zeros(int(rng.uniform(0.05, 0.15) * sample_rate), dtype=np.float32))
+    parts.append(np.zeros(sample_rate // 2, dtype=np.float32))
+    return np.concatenate(parts)
+
+
+def run_synthetic(clips_dir: str, force: bool) -> str:
+    out_dir = os.path.join(clips_dir, "synthetic")
+    os.makedirs(out_dir, exist_ok=True)
+    for seed, clip in enumerate(load_manifest(clips_dir)):
+        path = os.path.join(out_dir, clip["file"])
+        if os.path.exists(path) and not force:
+            continue
+        samples = babble(clip["text"], seed)
+        sf.write(path, samples, 16000, subtype="PCM_16")
+        print(f"synthetic/{clip['file']:<16}{len(samples) / 16000:>6.1f}s")
+    return out_dir
+
+
+async def run(clips_dir: str, force: bool):
+    for clip in load_manifest(clips_dir):
+        path = os.path.join(clips_dir, clip["file"])
+        if os.path.exists(path) and not force:
+            continue
+        mp3 = await synthesize_with_edge(clip["text"], voice=clip["voice"])
+        audio = await ingest_audio(mp3, "mp3")
+        sf.write(path, audio.samples, audio.sample_rate, subtype="PCM_16")
+        print(f"{clip['file']:<16}{audio.duration:>6.1f}s  {clip['text']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", default=CLIPS_DIR, help="Directory with manifest.json")
+    parser.add_argument("--force", action="store_true", help="Re-render clips that already exist")
+    parser.add_argument("--synthetic", action="store_true", help="Render offline speech-like stand-ins instead")
+    args = parser.parse_args()
+    if args.synthetic:
+        run_synthetic(args.clips, args.force)
+    else:
+        asyncio.run(run(args.clips, args.force))
@@ -0,0 +1,81 @@
+"""Whisper throughput vs p99 latency with micro-batching off and on.
+
+Needs openai-whisper (the model is downloaded on first run). Run from the repo root:
+    python -m benchmarks.stt_batching --concurrency 8 --requests 32 --window-ms 30
+Pass --clip with a short speech recording for realistic decode lengths.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from config import settings
+from modules import stt
+from utils.audio import ingest_audio
+
+
+def synthetic_clip(seconds: float = 3.0) -> np.ndarray:
+    rate = 16000
+    t = np.arange(int(seconds * rate)) / rate
+    # Voice-like: a few harmonics with a slow amplitude envelope
+    tone = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 560)))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    return (0.1 * tone * envelope).astype(np.float32)
+
+
+async def run_mode(samples: np.ndarray, concurrency: int, requests: int, window_ms: float) -> dict:
+    stt.shutdown_pool()
+    settings.stt_batch_window_ms = window_ms
+    settings.stt_queue_depth = max(settings.stt_queue_depth, concurrency)
+    await stt.start_pool()
+    await stt.transcribe_with_whisper(samples)  # warm-up
+
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            await stt.transcribe_with_whisper(samples)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    }
+
+
+async def run(args):
+    if args.clip:
+        with open(args.clip, "rb") as f:
+            samples = (await ingest_audio(f.read())).samples
+    else:
+        samples = synthetic_clip()
+
+    settings.stt_max_batch = args.max_batch
+    print(f"{'mode':<14}{'req/s':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, window in (("unbatched", 0), (f"batch {args.window_ms:g}ms", args.window_ms)):
+        result = await run_mode(samples, args.concurrency, args.requests, window)
+        print(f"{name:<14}{result['throughput']:>8.2f}{result['p50']:>10.0f}{result['p99']:>10.0f}")
+    stt.shutdown_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=30)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--clip", help="WAV/FLAC file to transcribe instead of a synthetic clip")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""Per-request STT ingest overhead: temp WAV + Whisper's ffmpeg vs in-memory 16 kHz decode.
+
+Measures only the work before inference (the model is not loaded). The old
+path needs openai-whisper and ffmpeg installed. Run from the repo root:
+    python -m benchmarks.stt_ingest --runs 20
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import time
+
+import numpy as np
+import soundfile as sf
+
+from utils.audio import save_to_temp_wav, cleanup_temp_file, load_audio_16k
+
+# (seconds, sample rate, channels) - typical short browser/mic recordings
+CLIPS = [(1, 48000, 1), (3, 44100, 2), (5, 16000, 1)]
+
+
+def make_clip(seconds: int, rate: int, channels: int) -> bytes:
+    rng = np.random.default_rng(seconds)
+    samples = (rng.standard_normal((seconds * rate, channels)) * 0.1).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, samples, rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+async def old_path(audio_data: bytes) -> np.ndarray:
+    from whisper.audio import load_audio
+
+    temp_path = await save_to_temp_wav(audio_data)
+    try:
+        return await asyncio.to_thread(load_audio, temp_path)
+    finally:
+        cleanup_temp_file(temp_path)
+
+
+async def new_path(audio_data: bytes) -> np.ndarray:
+    return await load_audio_16k(audio_data)
+
+
+async def timed(fn, audio_data: bytes, runs: int) -> float:
+    await fn(audio_data)  # warm-up
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn(audio_data)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+async def run(runs: int):
+    print(f"{'clip':<18}{'old ms':>10}{'new ms':>10}{'speedup':>10}")
+    for seconds, rate, channels in CLIPS:
+        audio_data = make_clip(seconds, rate, channels)
+        new = await timed(new_path, audio_data, runs)
+        try:
+            old = await timed(old_path, audio_data, runs)
+            old_col, speedup = f"{old:>10.1f}", f"{old / new:>9.1f}x"
+        except Exception as e:
+            old_col, speedup = f"{'n/a':>10}", f"  ({type(e).__name__})"
+        print(f"{f'{seconds}s {rate}Hz {channels}ch':<18}{old_col}{new:>10.1f}{speedup}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    asyncio.run(run(parser.parse_args().runs))
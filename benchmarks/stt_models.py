@@ -0,0 +1,108 @@
+"""Whisper model size x int8 quantization: real-time factor, memory and WER.
+
+Transcribes the clip set in benchmarks/clips (render it once with
+``python -m benchmarks.make_clips``) with every combination, each in a fresh
+process so peak memory isn't shared. Needs openai-whisper and torch. Run
+from the repo root:
+    python -m benchmarks.stt_models --models tiny,base,small
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import soundfile as sf
+
+from benchmarks.make_clips import CLIPS_DIR, load_manifest
+
+
+def words(text: str) -> list:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def word_errors(reference: str, hypothesis: str) -> int:
+    """Word-level edit distance (substitutions + deletions + insertions)."""
+    ref, hyp = words(reference), words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(model_name: str, quantize: bool, clips_dir: str, threads: int) -> dict:
+    """Runs in its own process: load one configuration and transcribe every clip."""
+    from config import settings
+    from modules import stt_engines
+    from utils.audio import ingest_samples
+
+    settings.whisper_model = model_name
+    settings.whisper_quantize = quantize
+    if threads:
+        stt_engines.set_threads(threads)
+    
+    clips = []
+    for clip in load_manifest(clips_dir):
+        samples, rate = sf.read(os.path.join(clips_dir, clip["file"]), dtype="float32")
+        clips.append((ingest_samples(samples, rate), clip["text"]))
+    
+    baseline = peak_rss_mb()
+    engine = stt_engines.get_engine("whisper")
+    start = time.perf_counter()
+    engine.load()
+    load_seconds = time.perf_counter() - start
+    engine.transcribe(clips[0][0].samples)  # warm-up
+    
+    audio_seconds = compute_seconds = 0.0
+    errors = reference_words = 0
+    for audio, reference in clips:
+        start = time.perf_counter()
+        text, _ = engine.transcribe(audio.samples)
+        compute_seconds += time.perf_counter() - start
+        audio_seconds += audio.duration
+        errors += word_errors(reference, text)
+        reference_words += len(words(reference))
+    
+    return {
+        "load_s": load_seconds,
+        "rtf": compute_seconds / audio_seconds,
+        "model_mb": peak_rss_mb() - baseline,
+        "peak_mb": peak_rss_mb(),
+        "wer": errors / reference_words
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", default="tiny,base,small", help="Comma-separated Whisper model sizes")
+    parser.add_argument("--clips", default=CLIPS_DIR)
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (0 = library default)")
+    args = parser.parse_args()
+
+    missing = [c["file"] for c in load_manifest(args.clips) if not os.path.exists(os.path.join(args.clips, c["file"]))]
+    if missing:
+        parser.error(f"missing clips ({', '.join(missing)}); run python -m benchmarks.make_clips first")
+
+    print(f"{'model':<10}{'quant':<7}{'load s':>8}{'RTF':>8}{'model MB':>10}{'peak MB':>9}{'WER':>8}")
+    context = multiprocessing.get_context("spawn")
+    for model_name in args.models.split(","):
+        for quantize in (False, True):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                r = executor.submit(measure, model_name, quantize, args.clips, args.threads).result()
+            print(
+                f"{model_name:<10}{'int8' if quantize else 'fp32':<7}{r['load_s']:>8.1f}{r['rtf']:>8.3f}"
+                f"{r['model_mb']:>10.0f}{r['peak_mb']:>9.0f}{r['wer']:>7.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
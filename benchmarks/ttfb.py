@@ -0,0 +1,54 @@
+"""Time-to-first-byte of the buffered vs streaming text chat endpoints.
+
+Needs a running backend (python main.py). Run from the repo root:
+    python -m benchmarks.ttfb --url http://localhost:8000 --runs 5
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import httpx
+
+QUESTIONS = [
+    "Tell me about yourself.",
+    "What are your strengths?",
+    "Describe a project you are proud of.",
+]
+
+
+def measure(client: httpx.Client, path: str, text: str) -> tuple:
+    payload = {"text": text, "output_format": "mp3", "session_id": uuid.uuid4().hex}
+    start = time.perf_counter()
+    first = None
+    size = 0
+    with client.stream("POST", path, json=payload) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_bytes():
+            if first is None and chunk:
+                first = time.perf_counter() - start
+            size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<20}{'ttfb p50 ms':>14}{'total p50 ms':>14}{'bytes':>10}")
+    with httpx.Client(base_url=args.url, timeout=120) as client:
+        for path in ("/api/text/chat", "/api/text/stream"):
+            results = [
+                measure(client, path, QUESTIONS[i % len(QUESTIONS)])
+                for i in range(args.runs)
+            ]
+            ttfb = statistics.median(r[0] for r in results) * 1000
+            total = statistics.median(r[1] for r in results) * 1000
+            size = int(statistics.mean(r[2] for r in results))
+            print(f"{path:<20}{ttfb:>14.0f}{total:>14.0f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
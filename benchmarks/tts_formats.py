@@ -0,0 +1,113 @@
+"""Bandwidth and time-to-playback of mp3, wav and Opus replies over a throttled link.
+
+Encodes one spoken reply in each format with the same encoder the API
+uses, serves it from a local TCP server that paces writes to the link's
+bandwidth after one round trip, and measures on the client side:
+
+- bytes on the wire
+- time until playback can start (the first ``--prebuffer`` seconds of audio
+  have arrived; bytes are assumed to be spread evenly over the clip)
+- time until the whole clip has arrived
+
+Uses --input (any audio file) if given, else synthesizes a reply with Edge
+TTS (needs network). Run from the repo root:
+    python -m benchmarks.tts_formats --link 3g --bitrates 16,24,32
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import soundfile as sf
+
+from utils.audio import encode_audio
+
+# name: (kbit/s down, round trip ms)
+LINKS = {
+    "2g": (100, 600),
+    "3g": (400, 300),
+    "4g": (4000, 80),
+}
+
+REPLY = (
+    "I'm currently pursuing my master's in mathematics and computing. "
+    "Most of my recent work has been on machine learning projects, "
+    "like a recommender system and this interview bot."
+)
+
+
+async def serve(payloads: dict, kbps: int, rtt_ms: int) -> asyncio.AbstractServer:
+    tick = 0.01
+    per_tick = max(1, int(kbps * 1000 / 8 * tick))
+
+    async def handle(reader, writer):
+        name = (await reader.readline()).decode().strip()
+        data = payloads[name]
+        await asyncio.sleep(rtt_ms / 1000)
+        for offset in range(0, len(data), per_tick):
+            writer.write(data[offset:offset + per_tick])
+            await writer.drain()
+            await asyncio.sleep(tick)
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def fetch(port: int, name: str, size: int, duration: float, prebuffer: float) -> tuple:
+    needed = size * min(prebuffer / duration, 1.0)
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{name}\n".encode())
+    await writer.drain()
+
+    received = 0
+    playback = None
+    while chunk := await reader.read(65536):
+        received += len(chunk)
+        if playback is None and received >= needed:
+            playback = time.perf_counter() - start
+    writer.close()
+    return playback, time.perf_counter() - start
+
+
+async def load_reply(path: str) -> bytes:
+    if path:
+        with open(path, "rb") as f:
+            return f.read()
+    from modules.tts import synthesize_with_edge
+    return await synthesize_with_edge(REPLY)
+
+
+async def run(args):
+    source = await load_reply(args.input)
+    duration = sf.info(io.BytesIO(source)).duration
+
+    payloads = {
+        "mp3": encode_audio(source, "mp3") if not source.startswith((b"ID3", b"\xff")) else source,
+        "wav": encode_audio(source, "wav"),
+    }
+    for bitrate in args.bitrates:
+        payloads[f"opus {bitrate}k"] = encode_audio(source, "opus", bitrate)
+
+    kbps, rtt_ms = LINKS[args.link]
+    server = await serve(payloads, kbps, rtt_ms)
+    port = server.sockets[0].getsockname()[1]
+
+    print(f"{duration:.1f}s reply over {args.link} ({kbps} kbit/s, {rtt_ms} ms RTT)")
+    print(f"{'format':<12}{'bytes':>10}{'kbit/s':>9}{'playback ms':>13}{'complete ms':>13}")
+    async with server:
+        for name, data in payloads.items():
+            playback, complete = await fetch(port, name, len(data), duration, args.prebuffer)
+            rate = len(data) * 8 / duration / 1000
+            print(f"{name:<12}{len(data):>10}{rate:>9.1f}{playback * 1000:>13.0f}{complete * 1000:>13.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", help="Reply audio file (default: synthesize one with Edge TTS)")
+    parser.add_argument("--link", choices=LINKS, default="3g")
+    parser.add_argument("--bitrates", default="16,24,32", help="Opus bitrates in kbit/s")
+    parser.add_argument("--prebuffer", type=float, default=0.5, help="Seconds of audio buffered before playback")
+    args = parser.parse_args()
+    args.bitrates = [int(b) for b in args.bitrates.split(",")]
+    asyncio.run(run(args))
@@ -7,13 +7,79 @@ load_dotenv()
 class Settings(BaseModel):
     groq_api_key: str = os.getenv("GROQ_API_KEY", "")
     groq_model: str = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    groq_base_url: str = os.getenv("GROQ_BASE_URL", "")
+    groq_backup_base_url: str = os.getenv("GROQ_BACKUP_BASE_URL", "")
+    groq_backup_api_key: str = os.getenv("GROQ_BACKUP_API_KEY", "")
+    groq_backup_model: str = os.getenv("GROQ_BACKUP_MODEL", "")
+    google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
+    google_model: str = os.getenv("GOOGLE_MODEL", "gemini-1.5-flash")
+    llm_providers: str = os.getenv("LLM_PROVIDERS", "groq,gemini")
+    llm_hedge_enabled: bool = os.getenv("LLM_HEDGE", "true").lower() == "true"
+    llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+    llm_hedge_max_median_multiple: float = float(os.getenv("LLM_HEDGE_MAX_MEDIAN_MULTIPLE", "3"))
+    llm_hedge_min_delay_ms: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "300"))
+    llm_hedge_default_delay_ms: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1500"))
+    llm_pool_max_connections: int = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+    llm_pool_max_keepalive: int = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+    llm_pool_keepalive_seconds: float = float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", "60"))
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+    llm_connect_timeout_seconds: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
     host: str = os.getenv("HOST", "0.0.0.0")
     port: int = int(os.getenv("PORT", "8000"))
     debug: bool = os.getenv("DEBUG", "false").lower() == "true"
     max_audio_duration_seconds: int = int(os.getenv("MAX_AUDIO_DURATION_SECONDS", "90"))
+    stt_engine: str = os.getenv("STT_ENGINE", "whisper")
+    stt_fallback_engines: str = os.getenv("STT_FALLBACK_ENGINES", "google")
+    whisper_model: str = os.getenv("WHISPER_MODEL", "base")
+    whisper_quantize: bool = os.getenv("WHISPER_QUANTIZE", "false").lower() == "true"
+    faster_whisper_model: str = os.getenv("FASTER_WHISPER_MODEL", "base")
+    faster_whisper_compute_type: str = os.getenv("FASTER_WHISPER_COMPUTE_TYPE", "int8")
+    stt_workers: int = int(os.getenv("STT_WORKERS", "0"))
+    stt_queue_depth: int = int(os.getenv("STT_QUEUE_DEPTH", "8"))
+    stt_job_timeout_seconds: float = float(os.getenv("STT_JOB_TIMEOUT_SECONDS", "60"))
+    stt_batch_window_ms: float = float(os.getenv("STT_BATCH_WINDOW_MS", "0"))
+    stt_max_batch: int = int(os.getenv("STT_MAX_BATCH", "8"))
+    stt_trim_silence: bool = os.getenv("STT_TRIM_SILENCE", "true").lower() == "true"
+    stt_trim_pad_ms: int = int(os.getenv("STT_TRIM_PAD_MS", "200"))
+    stt_streaming: bool = os.getenv("STT_STREAMING", "false").lower() == "true"
+    stt_stream_step_ms: int = int(os.getenv("STT_STREAM_STEP_MS", "1000"))
+    stt_stream_window_seconds: float = float(os.getenv("STT_STREAM_WINDOW_SECONDS", "15"))
+    vad_min_rms: float = float(os.getenv("VAD_MIN_RMS", "0.01"))
+    vad_end_silence_ms: int = int(os.getenv("VAD_END_SILENCE_MS", "600"))
     tts_voice: str = os.getenv("TTS_VOICE", "en-IN-NeerjaNeural")
     tts_rate: str = os.getenv("TTS_RATE", "+0%")
     tts_volume: str = os.getenv("TTS_VOLUME", "+0%")
+    tts_cache_memory_mb: float = float(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+    tts_cache_dir: str = os.getenv("TTS_CACHE_DIR", "")
+    tts_cache_disk_mb: float = float(os.getenv("TTS_CACHE_DISK_MB", "256"))
+    tts_prerender_formats: str = os.getenv("TTS_PRERENDER_FORMATS", "mp3")
+    tts_opus_bitrate_kbps: int = int(os.getenv("TTS_OPUS_BITRATE_KBPS", "24"))
+    answer_cache_enabled: bool = os.getenv("ANSWER_CACHE", "false").lower() == "true"
+    answer_cache_max_entries: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+    answer_cache_ttl_seconds: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    answer_cache_threshold: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8"))
+    answer_cache_max_history_turns: int = int(os.getenv("ANSWER_CACHE_MAX_HISTORY_TURNS", "0"))
+    history_token_budget: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+    history_keep_turns: int = int(os.getenv("HISTORY_KEEP_TURNS", "2"))
+    summary_max_tokens: int = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+    tts_timeout_seconds: float = float(os.getenv("TTS_TIMEOUT_SECONDS", "15"))
+    tts_slow_seconds: float = float(os.getenv("TTS_SLOW_SECONDS", "5"))
+    stt_slow_seconds: float = float(os.getenv("STT_SLOW_SECONDS", "15"))
+    llm_slow_first_token_seconds: float = float(os.getenv("LLM_SLOW_FIRST_TOKEN_SECONDS", "5"))
+    breaker_window: int = int(os.getenv("BREAKER_WINDOW", "20"))
+    breaker_min_calls: int = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    breaker_failure_rate: float = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    breaker_slow_rate: float = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+    breaker_open_seconds: float = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+    breaker_half_open_probes: int = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    profiling_enabled: bool = os.getenv("PROFILING", "false").lower() == "true"
+    profiling_sample_rate: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+    profiling_interval_ms: float = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+    profiling_buffer: int = int(os.getenv("PROFILING_BUFFER", "20"))
+    session_max_turns: int = int(os.getenv("SESSION_MAX_TURNS", "0"))
+    session_max_count: int = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+    session_ttl_seconds: int = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
     system_prompt: str = """You are Sudip. Full name Sudip Das.
 
 You must answer exactly as Sudip would answer in a real interview.
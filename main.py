@@ -1,16 +1,22 @@
-import io
+import json
+import asyncio
+import base64
 from contextlib import asynccontextmanager
 from typing import Optional
+from urllib.parse import quote
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from config import settings
-from modules import orchestrator, tts
+from modules import orchestrator, tts, stt, stt_engines, llm
+from modules.session import DEFAULT_SESSION
 from utils.logger import setup_logging, get_logger
-from utils.audio import get_audio_duration
+from utils import metrics, profiling
+from utils.resilience import breaker_stats, reset_breaker
+from utils.audio import ingest_audio, ingest_samples, PCM16Stream, VoiceActivityDetector, DecodedAudio
 
 setup_logging()
 logger = get_logger(__name__)
@@ -19,12 +25,13 @@ logger = get_logger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting VoiceBot...")
-    logger.info("Preloading Whisper model..")
-    from modules.stt import _load_whisper
-    await _load_whisper()
-    logger.info("Ready!")
+    # Warm up in the background; /ready reports 503 until it's done
+    logger.info(f"Warming up (STT engine: {settings.stt_engine})..")
+    warmup = asyncio.create_task(orchestrator.warm_up())
+    warmup.add_done_callback(lambda task: task.cancelled() or logger.info("Ready!"))
     yield
     logger.info("Shutting down...")
+    warmup.cancel()
     await orchestrator.cleanup()
 
 
@@ -35,13 +42,25 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
+app.add_middleware(profiling.ProfilingMiddleware)
+
+
+@app.exception_handler(stt.STTOverloadedError)
+async def stt_overloaded(request, exc: stt.STTOverloadedError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 # Request/Response schemas
 class TextRequest(BaseModel):
     text: str
     output_format: str = "mp3"
+    session_id: str = DEFAULT_SESSION
 
 
 class TextResponse(BaseModel):
@@ -51,29 +70,28 @@ class TextResponse(BaseModel):
     error: Optional[str] = None
 
 
-# Endpoints
-@app.get("/health")
-async def health():
-    return {"status": "healthy", "version": "1.0.0"}
+class AudioTextResponse(TextResponse):
+    audio_base64: Optional[str] = None
+    audio_format: Optional[str] = None
 
 
-@app.post("/api/voice/process")
-async def process_voice(
-    audio: UploadFile = File(...),
-    output_format: str = Form(default="mp3")
-):
-    if output_format not in ["mp3", "ogg", "wav"]:
-        raise HTTPException(400, "Format must be: mp3, ogg, wav")
-    
+CONTENT_TYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "opus": "audio/ogg; codecs=opus", "wav": "audio/wav"}
+
+# Formats whose per-sentence clips can simply be concatenated into one stream
+STREAM_FORMATS = ["mp3", "ogg", "opus"]
+
+# PCM rates the WebSocket accepts (resampled to 16 kHz for STT)
+MIN_PCM_SAMPLE_RATE = 8000
+MAX_PCM_SAMPLE_RATE = 48000
+
+
+async def _ingest_upload(audio: UploadFile) -> DecodedAudio:
+    """Read and decode an upload once; the result feeds the duration guard and STT."""
     audio_data = await audio.read()
+    await audio.close()
     if not audio_data:
         raise HTTPException(400, "Empty audio file")
     
-    # Check duration
-    duration = await get_audio_duration(audio_data)
-    if duration > settings.max_audio_duration_seconds:
-        raise HTTPException(400, f"Audio too long (max {settings.max_audio_duration_seconds}s)")
-    
     # Get format hint from filename
     format_hint = None
     if audio.filename:
@@ -81,29 +99,106 @@ async def process_voice(
         if ext in ["wav", "mp3", "ogg", "m4a", "webm", "flac"]:
             format_hint = ext
     
-    logger.info(f"Processing: {audio.filename}")
+    try:
+        decoded = await ingest_audio(audio_data, format_hint)
+    except Exception as e:
+        logger.warning(f"Could not decode {audio.filename}: {e}")
+        raise HTTPException(400, "Could not decode audio file")
     
-    result = await orchestrator.process_audio(audio_data, format_hint, output_format)
+    # Check duration
+    if decoded.duration > settings.max_audio_duration_seconds:
+        raise HTTPException(400, f"Audio too long (max {settings.max_audio_duration_seconds}s)")
     
-    if not result["success"] or not result["audio_output"]:
-        raise HTTPException(500, result.get("error", "Processing failed"))
+    return decoded
+
+
+async def _stream_audio_response(chunks, output_format: str) -> StreamingResponse:
+    # Wait for the first chunk so a synthesis failure is still a clean 500
+    try:
+        first = await anext(chunks)
+    except Exception as e:
+        logger.error(f"TTS error: {e}")
+        raise HTTPException(500, f"Speech synthesis failed: {e}")
     
-    content_types = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "wav": "audio/wav"}
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
     
-    return StreamingResponse(
-        io.BytesIO(result["audio_output"]),
-        media_type=content_types[output_format]
+    return StreamingResponse(body(), media_type=CONTENT_TYPES[output_format])
+
+
+async def _audio_chunks(events):
+    async for event in events:
+        if event["type"] == "audio":
+            yield event["data"]
+
+
+def _to_audio_text_response(result: dict, output_format: str) -> AudioTextResponse:
+    audio = result.get("audio_output")
+    return AudioTextResponse(
+        success=result["success"],
+        transcribed_text=result.get("transcribed_text"),
+        response_text=result.get("response_text"),
+        audio_base64=base64.b64encode(audio).decode("ascii") if audio else None,
+        audio_format=output_format if audio else None,
+        error=result.get("error")
     )
 
 
-@app.post("/api/voice/process-with-text", response_model=TextResponse)
-async def process_voice_text(audio: UploadFile = File(...), output_format: str = Form(default="mp3")):
-    audio_data = await audio.read()
-    if not audio_data:
-        raise HTTPException(400, "Empty audio file")
+# Endpoints
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "version": "1.0.0"}
+
+
+@app.get("/ready")
+async def ready():
+    status = orchestrator.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.post("/api/voice/process")
+async def process_voice(
+    audio: UploadFile = File(...),
+    output_format: str = Form(default="mp3"),
+    session_id: str = Form(default=DEFAULT_SESSION)
+):
+    if output_format not in CONTENT_TYPES:
+        raise HTTPException(400, f"Format must be: {', '.join(CONTENT_TYPES)}")
     
-    format_hint = audio.filename.rsplit(".", 1)[-1].lower() if audio.filename else None
-    result = await orchestrator.process_audio(audio_data, format_hint, output_format)
+    decoded = await _ingest_upload(audio)
+    logger.info(f"Processing: {audio.filename} ({decoded.duration:.1f}s {decoded.format})")
+    
+    result = await orchestrator.process_audio(
+        decoded, decoded.format, output_format, session_id, synthesize=False
+    )
+    
+    if not result["success"] or not result["response_text"]:
+        raise HTTPException(500, result.get("error", "Processing failed"))
+    
+    return await _stream_audio_response(
+        orchestrator.synthesize_stream(result["response_text"], output_format), output_format
+    )
+
+
+@app.post("/api/voice/process-with-text", response_model=TextResponse)
+async def process_voice_text(
+    audio: UploadFile = File(...),
+    output_format: str = Form(default="mp3"),
+    session_id: str = Form(default=DEFAULT_SESSION)
+):
+    decoded = await _ingest_upload(audio)
+    # Only the text goes back, so don't synthesize audio nobody receives
+    result = await orchestrator.process_audio(
+        decoded, decoded.format, output_format, session_id, synthesize=False
+    )
     
     return TextResponse(
         success=result["success"],
@@ -113,21 +208,76 @@ async def process_voice_text(audio: UploadFile = File(...), output_format: str =
     )
 
 
+@app.post("/api/voice/process-full", response_model=AudioTextResponse)
+async def process_voice_full(
+    audio: UploadFile = File(...),
+    output_format: str = Form(default="mp3"),
+    session_id: str = Form(default=DEFAULT_SESSION)
+):
+    """Single pass: transcript, reply text and base64 audio in one response."""
+    if output_format not in CONTENT_TYPES:
+        raise HTTPException(400, f"Format must be: {', '.join(CONTENT_TYPES)}")
+    
+    decoded = await _ingest_upload(audio)
+    result = await orchestrator.process_audio(decoded, decoded.format, output_format, session_id)
+    
+    return _to_audio_text_response(result, output_format)
+
+
+@app.post("/api/voice/stream")
+async def stream_voice(
+    audio: UploadFile = File(...),
+    output_format: str = Form(default="mp3"),
+    session_id: str = Form(default=DEFAULT_SESSION)
+):
+    """Chunked audio reply; the first sentence plays before the reply is finished."""
+    if output_format not in STREAM_FORMATS:
+        raise HTTPException(400, f"Streaming format must be: {', '.join(STREAM_FORMATS)}")
+    
+    decoded = await _ingest_upload(audio)
+    events = orchestrator.stream_audio(decoded, decoded.format, output_format, session_id)
+    
+    # The transcript is ready before any audio, so it can go in a header
+    transcript = await anext(events)
+    
+    return StreamingResponse(
+        _audio_chunks(events),
+        media_type=CONTENT_TYPES[output_format],
+        headers={"X-Transcribed-Text": quote(transcript["text"])}
+    )
+
+
+@app.post("/api/text/stream")
+async def stream_text_chat(request: TextRequest):
+    if not request.text.strip():
+        raise HTTPException(400, "Text cannot be empty")
+    if request.output_format not in STREAM_FORMATS:
+        raise HTTPException(400, f"Streaming format must be: {', '.join(STREAM_FORMATS)}")
+    
+    events = orchestrator.stream_text(request.text, request.output_format, request.session_id)
+    
+    return StreamingResponse(
+        _audio_chunks(events),
+        media_type=CONTENT_TYPES[request.output_format]
+    )
+
+
 @app.post("/api/text/chat")
 async def text_chat(request: TextRequest):
     if not request.text.strip():
         raise HTTPException(400, "Text cannot be empty")
+    if request.output_format not in CONTENT_TYPES:
+        raise HTTPException(400, f"Format must be: {', '.join(CONTENT_TYPES)}")
     
-    result = await orchestrator.process_text(request.text, request.output_format)
+    result = await orchestrator.process_text(
+        request.text, request.output_format, request.session_id, synthesize=False
+    )
     
     if not result["success"]:
         raise HTTPException(500, result.get("error", "Failed"))
     
-    content_types = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "wav": "audio/wav"}
-    
-    return StreamingResponse(
-        io.BytesIO(result["audio_output"]),
-        media_type=content_types[request.output_format]
+    return await _stream_audio_response(
+        orchestrator.synthesize_stream(result["response_text"], request.output_format), request.output_format
     )
 
 
@@ -136,18 +286,246 @@ async def text_chat_only(request: TextRequest):
     from modules import llm
     
     try:
-        response = await llm.generate(request.text)
+        response = await llm.generate(request.text, request.session_id)
         return TextResponse(success=True, transcribed_text=request.text, response_text=response)
     except Exception as e:
         return TextResponse(success=False, error=str(e))
 
 
+@app.post("/api/text/chat-full", response_model=AudioTextResponse)
+async def text_chat_full(request: TextRequest):
+    if not request.text.strip():
+        raise HTTPException(400, "Text cannot be empty")
+    if request.output_format not in CONTENT_TYPES:
+        raise HTTPException(400, f"Format must be: {', '.join(CONTENT_TYPES)}")
+    
+    result = await orchestrator.process_text(request.text, request.output_format, request.session_id)
+    
+    return _to_audio_text_response(result, request.output_format)
+
+
 @app.post("/api/conversation/clear")
-async def clear_conversation():
-    orchestrator.clear_conversation()
+async def clear_conversation(session_id: str = DEFAULT_SESSION):
+    orchestrator.clear_conversation(session_id)
     return {"status": "cleared"}
 
 
+def _control_type(text: str) -> Optional[str]:
+    """The "type" of a JSON control frame; None for anything else (ignored)."""
+    try:
+        control = json.loads(text)
+    except ValueError:
+        return None
+    return control.get("type") if isinstance(control, dict) else None
+
+
+@app.websocket("/ws/voice")
+async def voice_socket(
+    websocket: WebSocket,
+    session_id: str = DEFAULT_SESSION,
+    sample_rate: int = 16000,
+    output_format: str = "mp3"
+):
+    """Full-duplex voice chat.
+
+    Client sends 16-bit little-endian mono PCM frames as binary messages (or
+    {"type": "end"} to force end of utterance). Server end-points speech
+    with VAD, then streams reply audio as binary messages alongside JSON
+    events: speech_start, speech_end, transcript, text, interrupted, done.
+    With STT_STREAMING, partial events carry the transcript while the user
+    is still speaking. Speaking over the reply cancels it (barge-in).
+    """
+    await websocket.accept()
+    if output_format not in STREAM_FORMATS:
+        await websocket.close(code=1003, reason=f"Streaming format must be: {', '.join(STREAM_FORMATS)}")
+        return
+    if not MIN_PCM_SAMPLE_RATE <= sample_rate <= MAX_PCM_SAMPLE_RATE:
+        await websocket.close(code=1003, reason=f"sample_rate must be {MIN_PCM_SAMPLE_RATE}-{MAX_PCM_SAMPLE_RATE}")
+        return
+    
+    # Incremental STT re-decodes the utterance as it grows; local engines only
+    streaming = settings.stt_streaming and stt_engines.get_engine(settings.stt_engine).local
+    vad = VoiceActivityDetector(
+        sample_rate,
+        min_rms=settings.vad_min_rms,
+        end_silence_ms=settings.vad_end_silence_ms,
+        max_utterance_seconds=settings.max_audio_duration_seconds,
+        emit_audio=streaming
+    )
+    pcm = PCM16Stream()
+    reply_task = None
+    transcriber = None
+    partial_tasks = set()
+    
+    async def send_partial(current):
+        try:
+            if await current.update():
+                await websocket.send_json({
+                    "type": "partial",
+                    "committed": current.committed_text,
+                    "text": current.partial_text
+                })
+        except Exception as e:
+            logger.debug(f"Partial transcription skipped: {e}")
+    
+    async def reply(samples, current):
+        try:
+            if current is not None:
+                events = orchestrator.stream_transcriber(current, output_format, session_id)
+            else:
+                decoded = ingest_samples(samples, sample_rate)
+                events = orchestrator.stream_audio(decoded, decoded.format, output_format, session_id)
+            async for event in events:
+                if event["type"] == "audio":
+                    await websocket.send_bytes(event["data"])
+                else:
+                    await websocket.send_json(event)
+            error = None
+        except stt.STTOverloadedError as e:
+            error = {"type": "error", "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            logger.error(f"Voice reply failed: {e!r}")
+            error = {"type": "error", "error": str(e)}
+        
+        # The client waits for "done" after every utterance, even a failed one
+        try:
+            if error:
+                await websocket.send_json(error)
+            await websocket.send_json({"type": "done"})
+        except Exception as e:
+            logger.debug(f"Client gone before reply finished: {e!r}")
+    
+    def interrupt() -> bool:
+        if reply_task is not None and not reply_task.done():
+            reply_task.cancel()
+            return True
+        return False
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes"):
+                events = vad.feed(pcm.feed(message["bytes"]))
+            elif message.get("text") and _control_type(message["text"]) == "end":
+                events = vad.flush()
+            else:
+                events = []
+            
+            for kind, samples in events:
+                if kind == "start":
+                    # Barge-in: stop in-flight synthesis and tell the client to stop playback
+                    if interrupt():
+                        await websocket.send_json({"type": "interrupted"})
+                    await websocket.send_json({"type": "speech_start"})
+                    transcriber = stt.StreamingTranscriber() if streaming else None
+                elif kind == "audio":
+                    transcriber.feed(ingest_samples(samples, sample_rate).samples)
+                    if transcriber.ready():
+                        task = asyncio.create_task(send_partial(transcriber))
+                        partial_tasks.add(task)
+                        task.add_done_callback(partial_tasks.discard)
+                else:
+                    await websocket.send_json({"type": "speech_end"})
+                    interrupt()
+                    reply_task = asyncio.create_task(reply(samples, transcriber))
+                    transcriber = None
+    except WebSocketDisconnect:
+        pass
+    finally:
+        interrupt()
+        for task in partial_tasks:
+            task.cancel()
+
+
+@app.get("/api/stt/pool")
+async def stt_pool_stats():
+    stats = stt.get_pool().stats()
+    stats["trimming"] = stt.trim_stats()
+    if settings.stt_batch_window_ms > 0 and stt_engines.get_engine(settings.stt_engine).supports_batching:
+        stats["batching"] = stt.get_batcher(settings.stt_engine).stats()
+    return stats
+
+
+@app.get("/api/llm/hedging")
+async def hedging_stats():
+    return llm.hedge_stats()
+
+
+@app.get("/api/llm/prompt")
+async def prompt_stats():
+    return llm.prompt_stats()
+
+
+@app.get("/api/llm/cache")
+async def answer_cache_stats():
+    return llm.answer_cache_stats()
+
+
+@app.get("/api/tts/cache")
+async def tts_cache_stats():
+    return tts.get_cache().stats()
+
+
+@app.get("/api/tts/formats")
+async def tts_format_stats():
+    return tts.format_stats()
+
+
+def _check_admin(token: Optional[str]):
+    # Fail closed: without a configured token the admin endpoints are off
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if token != settings.admin_token:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/admin/breakers")
+async def get_breakers(x_admin_token: Optional[str] = Header(default=None)):
+    _check_admin(x_admin_token)
+    return breaker_stats()
+
+
+@app.post("/admin/breakers/{name}/reset")
+async def post_breaker_reset(name: str, x_admin_token: Optional[str] = Header(default=None)):
+    _check_admin(x_admin_token)
+    if not reset_breaker(name):
+        raise HTTPException(status_code=404, detail=f"Unknown breaker: {name}")
+    return {"status": "closed", "name": name}
+
+
+@app.get("/admin/profiling")
+async def get_profiling(x_admin_token: Optional[str] = Header(default=None)):
+    _check_admin(x_admin_token)
+    return profiling.status()
+
+
+@app.post("/admin/profiling")
+async def post_profiling(
+    enabled: bool,
+    sample_rate: Optional[float] = None,
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    _check_admin(x_admin_token)
+    profiling.configure(enabled, sample_rate)
+    return profiling.status()
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json", x_admin_token: Optional[str] = Header(default=None)):
+    """A stored profile as JSON, or its CPU samples as collapsed stacks
+    (format=collapsed) for flamegraph.pl / speedscope."""
+    _check_admin(x_admin_token)
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    if format == "collapsed":
+        return PlainTextResponse(profiling.collapsed(profile))
+    return profile
+
+
 @app.get("/api/tts/voices")
 async def get_voices():
     voices = await tts.list_voices()
@@ -0,0 +1,162 @@
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_DIM = 512
+
+# Function words and interview filler; everything else is a content word
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being bit but by
+can could did do does doing for from had has have how i i'm if in into is it
+it's just let little me more most my of on or our please really say should so
+some tell than that that's the their them then there these they this those to
+us very was we were what what's when where which who why will with would you
+you're you've your yours yourself well
+""".split())
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def content_words(text: str) -> frozenset:
+    """Words that carry the question's meaning, with a plural "s" dropped."""
+    words = (word for word in normalize(text).split() if word not in STOPWORDS)
+    return frozenset(word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words)
+
+
+def embed(text: str) -> np.ndarray:
+    """Local bag-of-n-grams embedding (hashed word unigrams/bigrams and
+    character trigrams), L2-normalised so a dot product is cosine similarity.
+
+    Cheap and dependency-free, but purely lexical: it sees shared words, not
+    meaning, so "what did you do/like at your last job" score 0.9. It's
+    only safe together with the content-word check in AnswerCache.get.
+    """
+    words = normalize(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in features:
+        # crc32 rather than hash(): stable across processes and restarts
+        vector[zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class CachedAnswer:
+    __slots__ = ("answer", "vector", "words", "created", "latency")
+
+    def __init__(self, answer: str, vector: np.ndarray, words: frozenset, latency: float):
+        self.answer = answer
+        self.vector = vector
+        self.words = words
+        self.created = time.monotonic()
+        self.latency = latency
+
+
+class AnswerCache:
+    """LLM replies keyed by normalised question, with a nearest-neighbour
+    fallback over question embeddings.
+
+    A near match must also have exactly the same content words, so it only
+    absorbs differences in filler and phrasing ("can you tell me about
+    yourself"), never a changed verb or noun.
+
+    Entries are kept in LRU order and expire ``ttl_seconds`` after they were
+    generated. The neighbour search is a single matrix-vector product over
+    all cached questions, which is plenty for a few thousand entries.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._matrix = None  # rebuilt lazily after inserts/evictions
+        self._keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 2)
+        }
+
+    def get(self, question: str) -> Optional[str]:
+        self._evict_expired()
+        key = normalize(question)
+        if not key:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+        else:
+            entry, key, similarity = self._nearest(embed(question))
+            if entry is None or similarity < self.threshold or entry.words != content_words(question):
+                self.misses += 1
+                return None
+            self.semantic_hits += 1
+            logger.info(f"Answer cache: semantic hit ({similarity:.2f}) '{key[:40]}'")
+
+        self._entries.move_to_end(key)
+        self.saved_seconds += entry.latency
+        return entry.answer
+
+    def put(self, question: str, answer: str, latency: float):
+        key = normalize(question)
+        if not key or not answer:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = CachedAnswer(answer, embed(question), content_words(question), latency)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def _nearest(self, vector: np.ndarray) -> tuple:
+        if not self._entries:
+            return None, None, 0.0
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[k].vector for k in self._keys])
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        key = self._keys[best]
+        return self._entries[key], key, float(scores[best])
+
+    def _evict_expired(self):
+        deadline = time.monotonic() - self.ttl_seconds
+        # Generation order, not LRU order, decides expiry; scan is cheap at this size
+        expired = [key for key, entry in self._entries.items() if entry.created < deadline]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
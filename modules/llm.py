@@ -1,14 +1,52 @@
 import os
+import time
 import random
+import asyncio
+from collections import deque
+from typing import AsyncIterator
+import httpx
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from modules.answer_cache import AnswerCache
+from modules.session import SessionStore, DEFAULT_SESSION
 from utils.logger import get_logger
+from utils.text import estimate_tokens
+from utils.metrics import mark_stage, record_call, record_fallback
+from utils.resilience import get_breaker, available, CircuitOpenError
 from config import settings
 
 logger = get_logger(__name__)
 
-# Chat history
-_history = []
+# Chat history, one bounded deque per session
+_sessions = SessionStore(
+    max_turns=settings.session_max_turns,
+    max_sessions=settings.session_max_count,
+    ttl_seconds=settings.session_ttl_seconds
+)
+
+# Replies to repeated questions early in a conversation (optional)
+_answers = AnswerCache(
+    max_entries=settings.answer_cache_max_entries,
+    ttl_seconds=settings.answer_cache_ttl_seconds,
+    threshold=settings.answer_cache_threshold
+)
+
+# Shared keep-alive connection pool and one chat client per (provider, model, temperature, max_tokens)
+_http_client = None
+_clients = {}
+
+# Prompt size of recent turns (for tuning HISTORY_TOKEN_BUDGET) and pending summaries
+_prompt_tokens = deque(maxlen=200)
+_summary_tasks = set()
+_summaries = 0
+
+SUMMARY_PROMPT = """You keep a running summary of an interview conversation.
+Merge the new turns into the existing summary. Keep the questions asked, the facts and opinions given in the answers, and anything the interviewer may refer back to. Drop filler.
+Reply with the updated summary only, in plain prose."""
+
+# Hedging: first-token latency per provider and how often the backup was needed
+_first_token_times = {}
+_hedge = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0}
 
 # Cached safe answers for fallback when LLM fails
 SAFE_ANSWERS = [
@@ -20,49 +58,439 @@ SAFE_ANSWERS = [
 ]
 
 
-def clear_history():
-    global _history
-    _history = []
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_pool_max_connections,
+                max_keepalive_connections=settings.llm_pool_max_keepalive,
+                keepalive_expiry=settings.llm_pool_keepalive_seconds
+            ),
+            timeout=httpx.Timeout(
+                settings.llm_timeout_seconds,
+                connect=settings.llm_connect_timeout_seconds
+            )
+        )
+    return _http_client
 
 
-def get_history():
-    return _history.copy()
+def _create_client(provider: str, model: str, temperature: float, max_tokens: int):
+    if provider == "gemini":
+        # Optional dependency, only needed when Gemini is in LLM_PROVIDERS
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        
+        return ChatGoogleGenerativeAI(
+            api_key=settings.google_api_key,
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            timeout=settings.llm_timeout_seconds
+        )
+    
+    backup = provider == "groq_backup"
+    return ChatGroq(
+        api_key=(settings.groq_backup_api_key if backup else "") or settings.groq_api_key,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        base_url=(settings.groq_backup_base_url if backup else settings.groq_base_url) or None,
+        timeout=settings.llm_timeout_seconds,
+        http_async_client=_get_http_client()
+    )
 
 
-async def generate(message: str) -> str:
-    global _history
-    
-    if not message or not message.strip():
-        raise ValueError("Message cannot be empty")
-    
-    llm = ChatGroq(
-        api_key=settings.groq_api_key,
-        model=settings.groq_model,
-        temperature=0.7,
-        max_tokens=256
+def _default_model(provider: str) -> str:
+    if provider == "gemini":
+        return settings.google_model
+    if provider == "groq_backup":
+        return settings.groq_backup_model or settings.groq_model
+    return settings.groq_model
+
+
+def get_client(model: str = None, temperature: float = 0.7, max_tokens: int = 256, provider: str = "groq"):
+    """Return the shared client for these options, creating it on first use."""
+    key = (provider, model or _default_model(provider), temperature, max_tokens)
+    client = _clients.get(key)
+    if client is None:
+        client = _create_client(*key)
+        _clients[key] = client
+        logger.info(f"LLM client created: {key}")
+    return client
+
+
+def providers() -> list:
+    """Configured providers in priority order, skipping ones without credentials."""
+    configured = {
+        "groq": bool(settings.groq_api_key),
+        "groq_backup": bool(settings.groq_backup_base_url),
+        "gemini": bool(settings.google_api_key)
+    }
+    names = [name.strip() for name in settings.llm_providers.split(",") if name.strip()]
+    unknown = [name for name in names if name not in configured]
+    if unknown:
+        raise ValueError(f"Unknown LLM provider(s): {', '.join(unknown)}")
+    return [name for name in names if configured[name]] or names[:1]
+
+
+async def warm_up():
+    """Open a keep-alive connection to the LLM API so the first turn skips DNS/TLS setup."""
+    base_url = (settings.groq_base_url or "https://api.groq.com").rstrip("/")
+    response = await _get_http_client().get(
+        f"{base_url}/openai/v1/models",
+        headers={"Authorization": f"Bearer {settings.groq_api_key}"}
     )
-    
-    # Build messages
+    response.raise_for_status()
+
+
+async def close_clients():
+    global _http_client
+    for task in list(_summary_tasks):
+        task.cancel()
+    _clients.clear()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def clear_history(session_id: str = DEFAULT_SESSION):
+    _sessions.clear(session_id)
+
+
+def get_history(session_id: str = DEFAULT_SESSION):
+    return _sessions.history(session_id)
+
+
+def answer_cache_stats() -> dict:
+    return {"enabled": settings.answer_cache_enabled, **_answers.stats()}
+
+
+def _cacheable(session) -> bool:
+    """Cached answers ignore history, so only use them early in a conversation."""
+    turns = len(session.messages) // 2
+    return settings.answer_cache_enabled and not session.summary and turns <= settings.answer_cache_max_history_turns
+
+
+def _remember(session, message: str, reply: str):
+    # Update history (the deque drops the oldest turn itself)
+    session.messages.append(HumanMessage(content=message))
+    session.messages.append(AIMessage(content=reply))
+
+
+def _message_tokens(messages) -> int:
+    # ~4 tokens of chat-template overhead per message
+    return sum(estimate_tokens(m.content) + 4 for m in messages)
+
+
+def _build_messages(session, message: str) -> list:
     messages = [SystemMessage(content=settings.system_prompt)]
-    messages.extend(_history)
+    if session.summary:
+        messages.append(SystemMessage(content=f"Summary of the conversation so far:\n{session.summary}"))
+    messages.extend(session.messages)
     messages.append(HumanMessage(content=message))
     
+    tokens = _message_tokens(messages)
+    _prompt_tokens.append(tokens)
+    logger.info(
+        f"Prompt: {tokens} tokens ({len(session.messages) // 2} turns verbatim"
+        f"{', with summary' if session.summary else ''})"
+    )
+    return messages
+
+
+def prompt_stats() -> dict:
+    sizes = _prompt_tokens
+    return {
+        "history_token_budget": settings.history_token_budget,
+        "turns": len(sizes),
+        "prompt_tokens_last": sizes[-1] if sizes else 0,
+        "prompt_tokens_avg": round(sum(sizes) / len(sizes), 1) if sizes else 0.0,
+        "prompt_tokens_max": max(sizes) if sizes else 0,
+        "summaries": _summaries,
+        "summaries_pending": len(_summary_tasks)
+    }
+
+
+def _over_budget(session) -> list:
+    """Oldest whole turns that don't fit the history budget, always keeping
+    the last HISTORY_KEEP_TURNS turns verbatim."""
+    messages = list(session.messages)
+    keep = settings.history_keep_turns * 2
+    total = _message_tokens(messages)
+    fold = 0
+    while total > settings.history_token_budget and len(messages) - fold > keep:
+        total -= _message_tokens(messages[fold:fold + 2])
+        fold += 2
+    return messages[:fold]
+
+
+def _schedule_summary(session):
+    """Fold turns beyond the budget into the summary in the background, after
+    the reply has gone out. Until it finishes they stay in the prompt."""
+    if session.summarizing:
+        return
+    old = _over_budget(session)
+    if not old:
+        return
+    session.summarizing = True
+    task = asyncio.create_task(_summarize(session, old))
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+
+async def _summarize(session, old: list):
+    global _summaries
     try:
-        response = await llm.ainvoke(messages)
-        reply = response.content.strip()
+        transcript = "\n".join(
+            f"{'Interviewer' if isinstance(m, HumanMessage) else 'You'}: {m.content}" for m in old
+        )
+        prompt = [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{session.summary or '(none)'}\n\nNew turns:\n{transcript}")
+        ]
+        try:
+            llm = get_client(temperature=0.2, max_tokens=settings.summary_max_tokens, provider=providers()[0])
+            summary = (await llm.ainvoke(prompt)).content.strip()
+            _summaries += 1
+        except Exception as e:
+            # Still enforce the budget; the old turns are simply dropped
+            logger.warning(f"History summary failed: {e}, dropping {len(old) // 2} old turns")
+            summary = session.summary
         
-        # Update history
-        _history.append(HumanMessage(content=message))
-        _history.append(AIMessage(content=reply))
+        async with session.lock:
+            folded = {id(m) for m in old}
+            while session.messages and id(session.messages[0]) in folded:
+                session.messages.popleft()
+            session.summary = summary
+        logger.info(f"Folded {len(old) // 2} turns into summary ({estimate_tokens(summary)} tokens)")
+    finally:
+        session.summarizing = False
+
+
+def hedge_delay() -> float:
+    """Seconds to wait for the primary's first token before firing the backup:
+    the LLM_HEDGE_PERCENTILE of its recent first-token times, capped at
+    LLM_HEDGE_MAX_MEDIAN_MULTIPLE x the median. Without the cap a stall
+    rate above the percentile's tail share puts the delay at the stall
+    itself, and the backup starts too late to win."""
+    times = sorted(_first_token_times.get(providers()[0], ()))
+    if len(times) < 20:
+        return settings.llm_hedge_default_delay_ms / 1000
+    index = min(len(times) - 1, int(len(times) * settings.llm_hedge_percentile / 100))
+    cap = times[len(times) // 2] * settings.llm_hedge_max_median_multiple
+    return max(settings.llm_hedge_min_delay_ms / 1000, min(times[index], cap))
+
+
+def hedge_stats() -> dict:
+    requests = _hedge["requests"]
+    first_token = {}
+    for provider, times in _first_token_times.items():
+        ordered = sorted(times)
+        first_token[provider] = {
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000)
+        }
+    return {
+        "enabled": settings.llm_hedge_enabled,
+        "providers": providers(),
+        "delay_ms": round(hedge_delay() * 1000),
+        **_hedge,
+        "hedge_rate": round(_hedge["hedged"] / requests, 3) if requests else 0.0,
+        "first_token": first_token
+    }
+
+
+class _Attempt:
+    """One provider streaming a reply into a queue, so attempts can race."""
+
+    def __init__(self, provider: str, messages: list):
+        self.provider = provider
+        self.queue = asyncio.Queue()
+        # Resolves to True at the first token (or an empty reply), or to the error
+        self.first = asyncio.get_running_loop().create_future()
+        self.started = time.perf_counter()
+        self.breaker = get_breaker(f"llm:{provider}", settings.llm_slow_first_token_seconds)
+        self.task = asyncio.create_task(self._run(messages))
+
+    def _record_first_token(self):
+        times = _first_token_times.setdefault(self.provider, deque(maxlen=200))
+        times.append(time.perf_counter() - self.started)
+
+    def _succeeded(self):
+        elapsed = time.perf_counter() - self.started
+        self._record_first_token()
+        self.breaker.record(True, elapsed)
+        record_call("llm", self.provider, "success", elapsed)
+        self.first.set_result(True)
+
+    def cancel(self):
+        # A loser cancelled before its first token has no first-token time;
+        # its elapsed time is just the hedge delay and would skew the sample
+        if not self.first.done():
+            self.first.cancel()
+            self.breaker.release()
+            record_call("llm", self.provider, "cancelled")
+        self.task.cancel()
+
+    async def _run(self, messages: list):
+        if not self.breaker.allow():
+            record_call("llm", self.provider, "circuit_open")
+            self.first.set_result(CircuitOpenError(self.breaker.name))
+            return
+        try:
+            async for chunk in get_client(provider=self.provider).astream(messages):
+                if not chunk.content:
+                    continue
+                if not self.first.done():
+                    self._succeeded()
+                await self.queue.put(chunk.content)
+            if not self.first.done():
+                self._succeeded()
+            await self.queue.put(None)
+        except Exception as e:
+            if not self.first.done():
+                self.breaker.record(False, time.perf_counter() - self.started)
+                record_call("llm", self.provider, "error")
+                self.first.set_result(e)
+            else:
+                await self.queue.put(e)
+
+
+async def _hedged_stream(messages: list) -> AsyncIterator[str]:
+    """Stream from the primary provider; if its first token is later than
+    hedge_delay(), race the next provider and keep whichever speaks first.
+    A provider that fails before its first token is replaced straight away,
+    and providers with an open breaker aren't tried at all."""
+    remaining = available(providers(), "llm")
+    if not remaining:
+        raise CircuitOpenError("llm")
+    primary = remaining[0]
+    racing = []
+    winner = None
+    last_error = None
+    launch = True
+    _hedge["requests"] += 1
+    
+    try:
+        while winner is None:
+            if launch and remaining:
+                if racing:
+                    _hedge["hedged"] += 1
+                elif last_error is not None:
+                    _hedge["failovers"] += 1
+                racing.append(_Attempt(remaining.pop(0), messages))
+            if not racing:
+                raise last_error
+            
+            hedging = settings.llm_hedge_enabled and remaining
+            done, _ = await asyncio.wait(
+                [attempt.first for attempt in racing],
+                timeout=hedge_delay() if hedging else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            # Timed out: fire the next provider alongside the slow one(s)
+            launch = not done
+            for attempt in list(racing):
+                if not attempt.first.done():
+                    continue
+                result = attempt.first.result()
+                if isinstance(result, Exception):
+                    logger.warning(f"LLM provider {attempt.provider} failed: {result}")
+                    last_error = result
+                    racing.remove(attempt)
+                    launch = launch or not racing
+                elif winner is None:
+                    winner = attempt
+        
+        if winner.provider != primary:
+            _hedge["hedge_wins"] += 1
+            logger.info(f"LLM reply from {winner.provider} (primary {primary} too slow or failed)")
+        if winner.provider != providers()[0]:
+            record_fallback("llm", winner.provider)
+        for attempt in racing:
+            if attempt is not winner:
+                attempt.cancel()
+        
+        while (delta := await winner.queue.get()) is not None:
+            if isinstance(delta, Exception):
+                raise delta
+            yield delta
+    finally:
+        for attempt in racing:
+            attempt.cancel()
+
+
+async def generate(message: str, session_id: str = DEFAULT_SESSION) -> str:
+    if not message or not message.strip():
+        raise ValueError("Message cannot be empty")
+    
+    session = _sessions.get(session_id)
+    
+    # One turn at a time per session; different sessions run in parallel
+    async with session.lock:
+        cacheable = _cacheable(session)
+        if cacheable and (reply := _answers.get(message)) is not None:
+            _remember(session, message, reply)
+            mark_stage("cached")
+            return reply
+        
+        messages = _build_messages(session, message)
+        
+        try:
+            start = time.perf_counter()
+            reply = "".join([delta async for delta in _hedged_stream(messages)]).strip()
+            if cacheable:
+                _answers.put(message, reply, time.perf_counter() - start)
+            
+            _remember(session, message, reply)
+            _schedule_summary(session)
+            
+            logger.info(f"Generated: '{reply[:50]}...'")
+            return reply
+            
+        except Exception as e:
+            logger.error(f"LLM error: {e}, using cached safe answer")
+            record_fallback("llm", "safe_answer")
+            # Return a cached safe answer instead of failing
+            return random.choice(SAFE_ANSWERS)
+
+
+async def stream(message: str, session_id: str = DEFAULT_SESSION) -> AsyncIterator[str]:
+    """Like generate(), but yields the reply as text deltas while it is produced."""
+    if not message or not message.strip():
+        raise ValueError("Message cannot be empty")
+    
+    session = _sessions.get(session_id)
+    
+    async with session.lock:
+        cacheable = _cacheable(session)
+        if cacheable and (reply := _answers.get(message)) is not None:
+            _remember(session, message, reply)
+            yield reply
+            return
         
-        # Keep history short
-        if len(_history) > 20:
-            _history = _history[-20:]
+        messages = _build_messages(session, message)
+        parts = []
         
-        logger.info(f"Generated: '{reply[:50]}...'")
-        return reply
+        try:
+            start = time.perf_counter()
+            async for delta in _hedged_stream(messages):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            if parts:
+                logger.error(f"LLM stream error: {e}, keeping partial reply")
+                cacheable = False
+            else:
+                logger.error(f"LLM error: {e}, using cached safe answer")
+                record_fallback("llm", "safe_answer")
+                yield random.choice(SAFE_ANSWERS)
+                return
         
-    except Exception as e:
-        logger.error(f"LLM error: {e}, using cached safe answer")
-        # Return a cached safe answer instead of failing
-        return random.choice(SAFE_ANSWERS)
+        reply = "".join(parts).strip()
+        if reply:
+            if cacheable:
+                _answers.put(message, reply, time.perf_counter() - start)
+            _remember(session, message, reply)
+            _schedule_summary(session)
+            logger.info(f"Streamed: '{reply[:50]}...'")
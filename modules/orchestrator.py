@@ -1,70 +1,116 @@
-from typing import TypedDict, Optional
+import asyncio
+import time
+from typing import TypedDict, Optional, AsyncIterator, Union
 from langgraph.graph import StateGraph, END
 
+from config import settings
 from modules import stt, tts, llm
+from modules.session import DEFAULT_SESSION
+from utils.audio import DecodedAudio
 from utils.logger import get_logger
+from utils.metrics import track_stage
+from utils.text import SentenceSegmenter
 
 logger = get_logger(__name__)
 
+# Fixed replies
+REPEAT_MESSAGE = "I'm sorry, I didn't catch that clearly. Could you please repeat what you said?"
+ERROR_MESSAGE = "Sorry, I had trouble processing that. Please try again."
+
+# Warm-up progress per stage: pending -> warm | failed
+_warmup = {stage: {"status": "pending"} for stage in ("stt", "llm", "tts")}
+
 
 # State schema using TypedDict
 class PipelineState(TypedDict):
-    audio_input: bytes
+    audio_input: Union[bytes, DecodedAudio]
     audio_format: Optional[str]
     transcribed_text: Optional[str]
     llm_response: Optional[str]
     audio_output: Optional[bytes]
     output_format: str
+    synthesize: bool
+    session_id: str
     error: Optional[str]
 
 
 # Pipeline node functions
+def _transcript_result(text: str) -> dict:
+    if not text:
+        return {"error": "Could not transcribe audio"}
+    
+    # Handle low confidence or no speech at all - ask user to repeat
+    if text in (stt.LOW_CONFIDENCE, stt.NO_SPEECH):
+        return {
+            "transcribed_text": "",
+            "llm_response": REPEAT_MESSAGE
+        }
+    
+    return {"transcribed_text": text}
+
+
 async def stt_node(state: PipelineState) -> dict:
-    try:
-        text = await stt.transcribe(state["audio_input"], state.get("audio_format"))
-        if not text:
-            return {"error": "Could not transcribe audio"}
+    with track_stage("stt") as metric:
+        try:
+            text = await stt.transcribe(state["audio_input"], state.get("audio_format"))
+        except stt.STTOverloadedError:
+            # Surface overload to the caller (HTTP 503) rather than speaking an error
+            metric["outcome"] = "overloaded"
+            raise
+        except Exception as e:
+            logger.error(f"STT error: {e}")
+            metric["outcome"] = "error"
+            return {"error": f"Speech recognition failed: {e}"}
         
-        # Handle low confidence - ask user to repeat
-        if text == "[LOW_CONFIDENCE]":
-            return {
-                "transcribed_text": "",
-                "llm_response": "I'm sorry, I didn't catch that clearly. Could you please repeat what you said?"
-            }
-        
-        return {"transcribed_text": text}
-    except Exception as e:
-        logger.error(f"STT error: {e}")
-        return {"error": f"Speech recognition failed: {e}"}
+        if text == stt.LOW_CONFIDENCE:
+            metric["outcome"] = "low_confidence"
+        elif text == stt.NO_SPEECH:
+            metric["outcome"] = "no_speech"
+        elif not text:
+            metric["outcome"] = "error"
+        return _transcript_result(text)
 
 
 async def llm_node(state: PipelineState) -> dict:
-    try:
-        response = await llm.generate(state["transcribed_text"])
-        if not response:
-            return {"error": "LLM returned empty response"}
-        return {"llm_response": response}
-    except Exception as e:
-        logger.error(f"LLM error: {e}")
-        return {"error": f"Failed to generate response: {e}"}
+    with track_stage("llm") as metric:
+        try:
+            response = await llm.generate(
+                state["transcribed_text"], state.get("session_id", DEFAULT_SESSION)
+            )
+            if not response:
+                metric["outcome"] = "error"
+                return {"error": "LLM returned empty response"}
+            return {"llm_response": response}
+        except Exception as e:
+            logger.error(f"LLM error: {e}")
+            metric["outcome"] = "error"
+            return {"error": f"Failed to generate response: {e}"}
 
 
 async def tts_node(state: PipelineState) -> dict:
-    try:
-        audio = await tts.synthesize(state["llm_response"], state.get("output_format", "mp3"))
-        return {"audio_output": audio}
-    except Exception as e:
-        logger.error(f"TTS error: {e}")
-        return {"error": f"Speech synthesis failed: {e}"}
+    # Caller streams the audio itself
+    if not state.get("synthesize", True):
+        return {}
+    with track_stage("tts") as metric:
+        try:
+            audio = await tts.synthesize(state["llm_response"], state.get("output_format", "mp3"))
+            return {"audio_output": audio}
+        except Exception as e:
+            logger.error(f"TTS error: {e}")
+            metric["outcome"] = "error"
+            return {"error": f"Speech synthesis failed: {e}"}
 
 
 async def error_node(state: PipelineState) -> dict:
-    error_msg = "Sorry, I had trouble processing that. Please try again."
-    try:
-        audio = await tts.synthesize(error_msg, state.get("output_format", "mp3"))
-        return {"llm_response": error_msg, "audio_output": audio}
-    except:
-        return {}
+    if not state.get("synthesize", True):
+        return {"llm_response": ERROR_MESSAGE}
+    with track_stage("error") as metric:
+        try:
+            audio = await tts.synthesize(ERROR_MESSAGE, state.get("output_format", "mp3"))
+            return {"llm_response": ERROR_MESSAGE, "audio_output": audio}
+        except:
+            metric["outcome"] = "error"
+            return {}
 
 
 def check_error(state: PipelineState) -> str:
@@ -112,7 +158,15 @@ def get_pipeline():
     return _pipeline
 
 
-async def process_audio(audio_data: bytes, audio_format: str = None, output_format: str = "mp3") -> dict:
+async def process_audio(
+    audio_data: Union[bytes, DecodedAudio],
+    audio_format: str = None,
+    output_format: str = "mp3",
+    session_id: str = DEFAULT_SESSION,
+    synthesize: bool = True
+) -> dict:
+    """Run the full pipeline. With synthesize=False the reply audio is left
+    to the caller (e.g. to stream it with tts.synthesize_stream)."""
     logger.info("Processing audio...")
     
     initial_state: PipelineState = {
@@ -122,6 +176,8 @@ async def process_audio(audio_data: bytes, audio_format: str = None, output_form
         "llm_response": None,
         "audio_output": None,
         "output_format": output_format,
+        "synthesize": synthesize,
+        "session_id": session_id,
         "error": None,
     }
     
@@ -137,10 +193,19 @@ async def process_audio(audio_data: bytes, audio_format: str = None, output_form
     }
 
 
-async def process_text(text: str, output_format: str = "mp3") -> dict:
+async def process_text(
+    text: str,
+    output_format: str = "mp3",
+    session_id: str = DEFAULT_SESSION,
+    synthesize: bool = True
+) -> dict:
     try:
-        response = await llm.generate(text)
-        audio = await tts.synthesize(response, output_format)
+        with track_stage("llm"):
+            response = await llm.generate(text, session_id)
+        audio = None
+        if synthesize:
+            with track_stage("tts"):
+                audio = await tts.synthesize(response, output_format)
         return {
             "success": True,
             "transcribed_text": text,
@@ -152,10 +217,165 @@ async def process_text(text: str, output_format: str = "mp3") -> dict:
         return {"success": False, "error": str(e)}
 
 
-def clear_conversation():
-    llm.clear_history()
+async def synthesize_stream(text: str, output_format: str = "mp3") -> AsyncIterator[bytes]:
+    """tts.synthesize_stream, timed as the "tts" stage until the last chunk."""
+    with track_stage("tts"):
+        async for chunk in tts.synthesize_stream(text, output_format):
+            yield chunk
+
+
+async def stream_text(
+    text: str,
+    output_format: str = "mp3",
+    session_id: str = DEFAULT_SESSION
+) -> AsyncIterator[dict]:
+    """Streaming variant of process_text.
+
+    LLM tokens are cut into finished sentences and each one is synthesized at
+    once, while the LLM keeps generating in a background task. Yields
+    ``{"type": "text", "text": ...}`` for each sentence followed by
+    ``{"type": "audio", "data": ...}`` with its audio.
+    """
+    sentences = asyncio.Queue()
+    
+    async def produce():
+        segmenter = SentenceSegmenter()
+        try:
+            with track_stage("llm"):
+                async for delta in llm.stream(text, session_id):
+                    for sentence in segmenter.feed(delta):
+                        await sentences.put(sentence)
+            tail = segmenter.flush()
+            if tail:
+                await sentences.put(tail)
+        finally:
+            await sentences.put(None)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while (sentence := await sentences.get()) is not None:
+            yield {"type": "text", "text": sentence}
+            async for chunk in synthesize_stream(sentence, output_format):
+                yield {"type": "audio", "data": chunk}
+        await producer
+    finally:
+        producer.cancel()
+
+
+async def stream_audio(
+    audio_data: Union[bytes, DecodedAudio],
+    audio_format: str = None,
+    output_format: str = "mp3",
+    session_id: str = DEFAULT_SESSION
+) -> AsyncIterator[dict]:
+    """Streaming variant of process_audio.
+
+    The first event is always ``{"type": "transcript", "text": ...}``; the
+    rest are the same text/audio events as stream_text.
+    """
+    result = await stt_node({"audio_input": audio_data, "audio_format": audio_format})
+    async for event in _reply_events(result, output_format, session_id):
+        yield event
+
+
+async def stream_transcriber(
+    transcriber: "stt.StreamingTranscriber",
+    output_format: str = "mp3",
+    session_id: str = DEFAULT_SESSION
+) -> AsyncIterator[dict]:
+    """Like stream_audio, for an utterance already transcribed incrementally:
+    only the short uncommitted tail is decoded before the LLM starts."""
+    try:
+        result = _transcript_result(await transcriber.finish())
+    except stt.STTOverloadedError:
+        raise
+    except Exception as e:
+        logger.error(f"STT error: {e}")
+        result = {"error": f"Speech recognition failed: {e}"}
+    
+    async for event in _reply_events(result, output_format, session_id):
+        yield event
+
+
+async def _reply_events(result: dict, output_format: str, session_id: str) -> AsyncIterator[dict]:
+    yield {"type": "transcript", "text": result.get("transcribed_text") or ""}
+    
+    if result.get("error"):
+        yield {"type": "error", "error": result["error"]}
+        fixed_reply = ERROR_MESSAGE
+    else:
+        fixed_reply = result.get("llm_response")
+    
+    # Low confidence or STT failure: speak the fixed reply and skip the LLM
+    if fixed_reply:
+        yield {"type": "text", "text": fixed_reply}
+        async for chunk in synthesize_stream(fixed_reply, output_format):
+            yield {"type": "audio", "data": chunk}
+        return
+    
+    async for event in stream_text(result["transcribed_text"], output_format, session_id):
+        yield event
+
+
+def fixed_phrases() -> list:
+    """Replies that don't come from the LLM, plus the sentences stream_text
+    would split them into (a SAFE_ANSWERS reply is streamed sentence by
+    sentence)."""
+    phrases = [REPEAT_MESSAGE, ERROR_MESSAGE, *llm.SAFE_ANSWERS]
+    for phrase in list(phrases):
+        segmenter = SentenceSegmenter()
+        phrases += segmenter.feed(phrase) + [segmenter.flush()]
+    return [phrase for phrase in phrases if phrase]
+
+
+async def prerender():
+    formats = [fmt.strip() for fmt in settings.tts_prerender_formats.split(",") if fmt.strip()]
+    await tts.prerender(fixed_phrases(), formats)
+
+
+async def _warm_stage(stage: str, step):
+    start = time.perf_counter()
+    try:
+        await step
+        _warmup[stage] = {"status": "warm"}
+    except Exception as e:
+        logger.warning(f"Warm-up {stage} failed: {e}")
+        _warmup[stage] = {"status": "failed", "error": str(e)}
+    _warmup[stage]["seconds"] = round(time.perf_counter() - start, 2)
+    logger.info(f"Warm-up {stage}: {_warmup[stage]['status']} in {_warmup[stage]['seconds']}s")
+
+
+async def warm_up():
+    """Dummy STT inference, LLM connection pre-open and TTS pre-render, in parallel."""
+    await asyncio.gather(
+        _warm_stage("stt", stt.warm_up()),
+        _warm_stage("llm", llm.warm_up()),
+        _warm_stage("tts", prerender())
+    )
+
+
+def readiness() -> dict:
+    """Ready once every stage has finished and the local STT model is warm.
+
+    LLM and TTS are remote services shared by every replica, so a failed
+    pre-open is reported but doesn't hold the replica back.
+    """
+    pool = stt.get_pool().stats()
+    finished = all(stage["status"] != "pending" for stage in _warmup.values())
+    return {
+        "ready": finished and _warmup["stt"]["status"] == "warm",
+        "stages": dict(_warmup),
+        "stt_in_flight": pool["in_flight"],
+        "stt_queue_depth": pool["queue_depth"]
+    }
+
+
+def clear_conversation(session_id: str = DEFAULT_SESSION):
+    llm.clear_history(session_id)
 
 
 async def cleanup():
     logger.info("Cleaning up orchestrator resources...")
+    await llm.close_clients()
+    stt.shutdown_pool()
 
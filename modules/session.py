@@ -0,0 +1,75 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_SESSION = "default"
+
+
+class Session:
+    """Conversation history for one session: recent messages verbatim plus a
+    rolling summary of older turns. ``max_messages`` of 0 means unbounded."""
+
+    __slots__ = ("messages", "summary", "summarizing", "lock", "last_used")
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages or None)
+        self.summary = ""
+        self.summarizing = False
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """Session-keyed histories with a session cap, LRU order and idle TTL.
+
+    Sessions are kept in least-recently-used order, so both idle expiry and
+    capacity eviction only ever pop from the front.
+    """
+
+    def __init__(self, max_turns: int, max_sessions: int, ttl_seconds: float):
+        self.max_messages = max_turns * 2
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def get(self, session_id: str) -> Session:
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(self.max_messages)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                logger.info(f"Session evicted (capacity): {evicted}")
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_used = now
+        return session
+
+    def history(self, session_id: str) -> list:
+        session = self._sessions.get(session_id)
+        return list(session.messages) if session else []
+
+    def clear(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def clear_all(self):
+        self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_expired(self, now: float):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            logger.info(f"Session evicted (idle): {session_id}")
@@ -1,98 +1,518 @@
 import os
+import math
+import time
 import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from config import settings
 from utils.logger import get_logger
-from utils.audio import save_to_temp_wav, cleanup_temp_file
+from modules import stt_engines
+from utils.audio import ingest_audio, trim_silence, DecodedAudio, WHISPER_SAMPLE_RATE
+from utils.metrics import record_call, record_fallback
+from utils.resilience import get_breaker, available, CircuitOpenError
 
 logger = get_logger(__name__)
 
-_whisper_model = None
+_pool = None
+_batcher = None
 
-# Cache directory for Whisper model
-WHISPER_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "whisper")
+# Below this confidence the orchestrator asks the user to repeat
+CONFIDENCE_THRESHOLD = 0.4
+LOW_CONFIDENCE = "[LOW_CONFIDENCE]"
+# No speech frames at all: answered without running STT or the LLM
+NO_SPEECH = "[NO_SPEECH]"
 
+# Silence trimmed before STT, for /api/stt/pool
+_trim = {"requests": 0, "no_speech": 0, "input_seconds": 0.0, "trimmed_seconds": 0.0}
 
-async def _load_whisper(model_name: str = "base"):
-    global _whisper_model
-    if _whisper_model is None:
-        os.makedirs(WHISPER_CACHE_DIR, exist_ok=True)
+# Warm-up input: one second of silence
+WARMUP_CLIP = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+
+# Whisper decodes 30 s windows; longer clips can't share a batched forward pass
+WHISPER_WINDOW_SAMPLES = 30 * WHISPER_SAMPLE_RATE
+
+
+class STTOverloadedError(Exception):
+    """The STT job queue is full; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Speech recognition is overloaded, please retry later")
+        self.retry_after = retry_after
+
+
+# Worker side (process or thread): each process holds its own model replicas
+def _init_worker(engine_name: str, threads: int):
+    stt_engines.set_threads(threads)
+    stt_engines.get_engine(engine_name).load()
+
+
+def _ping_worker() -> int:
+    return os.getpid()
+
+
+def _load_engine(engine_name: str):
+    stt_engines.get_engine(engine_name).load()
+
+
+def _engine_job(engine_name: str, audio) -> dict:
+    started = time.time()
+    text, confidence = stt_engines.get_engine(engine_name).transcribe(audio)
+    return {"text": text, "confidence": confidence, "started": started}
+
+
+def _engine_segments_job(engine_name: str, audio) -> dict:
+    started = time.time()
+    segments = stt_engines.get_engine(engine_name).transcribe_segments(audio)
+    return {"segments": segments, "started": started}
+
+
+def _engine_batch_job(engine_name: str, batch: list) -> dict:
+    started = time.time()
+    results = stt_engines.get_engine(engine_name).transcribe_batch(batch)
+    return {"results": results, "started": started}
+
+
+class STTPool:
+    """Local STT model replicas behind a bounded job queue.
+
+    ``workers`` > 0 runs that many processes, each with its own model, so
+    jobs don't share one model across threads. ``workers`` == 0 keeps the
+    in-process model on a single dedicated thread. Either way at most
+    ``workers + queue_depth`` jobs are admitted; beyond that callers get
+    STTOverloadedError instead of an ever-growing wait.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, job_timeout: float, engine_name: str):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + queue_depth
+        self.job_timeout = job_timeout
+        self.engine_name = engine_name
+        self.in_process = workers == 0
+        
+        if self.in_process:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt")
+        else:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(engine_name, threads)
+            )
+        
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._wait_times = deque(maxlen=200)
+        self._service_times = deque(maxlen=200)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    async def start(self):
+        """Load the model in every replica before traffic arrives."""
+        loop = asyncio.get_running_loop()
+        if self.in_process:
+            await loop.run_in_executor(self._executor, _load_engine, self.engine_name)
+        else:
+            pids = await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _ping_worker) for _ in range(self.workers)
+            ])
+            logger.info(f"STT workers ready: {sorted(set(pids))}")
+
+    def retry_after(self) -> int:
+        service = sum(self._service_times) / len(self._service_times) if self._service_times else 2.0
+        return max(1, math.ceil(service * (self.queue_depth + 1) / self.workers))
+
+    def stats(self) -> dict:
+        waits = self._wait_times
+        return {
+            "engine": self.engine_name,
+            "workers": self.workers,
+            "mode": "thread" if self.in_process else "process",
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(max(waits) * 1000, 1) if waits else 0.0,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts
+        }
+
+    async def transcribe(self, engine_name: str, audio) -> tuple:
+        result = await self._submit(_engine_job, engine_name, audio)
+        return result["text"], result["confidence"]
+
+    async def transcribe_segments(self, engine_name: str, audio) -> list:
+        result = await self._submit(_engine_segments_job, engine_name, audio)
+        return result["segments"]
+
+    async def transcribe_batch(self, engine_name: str, batch: list) -> list:
+        result = await self._submit(_engine_batch_job, engine_name, batch)
+        return result["results"]
+
+    async def _submit(self, job, *args) -> dict:
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise STTOverloadedError(self.retry_after())
+        
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self.in_flight += 1
+        future = self._executor.submit(job, *args)
+        # The slot is held until the job really ends, even if the caller timed out
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._finished, f, submitted))
+        
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.job_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"STT job exceeded {self.job_timeout}s")
+
+    def _finished(self, future, submitted: float):
+        self.in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        started = future.result()["started"]
+        self.completed += 1
+        self._wait_times.append(max(0.0, started - submitted))
+        self._service_times.append(time.time() - started)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class STTBatcher:
+    """Collect concurrent requests for up to ``window_ms`` (or ``max_batch``
+    clips) and run them as one batched pass on the pool (engines that
+    support it, i.e. Whisper)."""
+
+    def __init__(self, pool: STTPool, engine_name: str, window_ms: float, max_batch: int):
+        self.pool = pool
+        self.engine_name = engine_name
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.batched_requests = 0
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_requests / self.batches, 2) if self.batches else 0.0
+        }
+
+    async def transcribe(self, audio) -> tuple:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((audio, future))
         
-        logger.info(f"Loading Whisper model: {model_name} (cache: {WHISPER_CACHE_DIR})")
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
         
-        import whisper
-        _whisper_model = await asyncio.to_thread(
-            whisper.load_model,
-            model_name,
-            download_root=WHISPER_CACHE_DIR
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            results = await self.pool.transcribe_batch(self.engine_name, [audio for audio, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def get_pool() -> STTPool:
+    global _pool
+    if _pool is None:
+        _pool = STTPool(
+            workers=settings.stt_workers,
+            queue_depth=settings.stt_queue_depth,
+            job_timeout=settings.stt_job_timeout_seconds,
+            engine_name=settings.stt_engine
         )
-        logger.info("Whisper loaded")
-    return _whisper_model
+    return _pool
 
 
-async def transcribe_with_whisper(audio_path: str, model_name: str = "base") -> tuple:
-    model = await _load_whisper(model_name)
-    
-    result = await asyncio.to_thread(
-        model.transcribe,
-        audio_path,
-        fp16=False,
-        language="en"
-    )
+async def start_pool():
+    await get_pool().start()
+
+
+async def warm_up():
+    """Load the engine and run one inference per replica, so first-inference
+    kernel setup isn't paid by the first real request."""
+    await start_pool()
+    engine = stt_engines.get_engine(settings.stt_engine)
+    if not engine.local:
+        return
     
-    text = result.get("text", "").strip()
+    pool = get_pool()
+    jobs = [pool.transcribe(settings.stt_engine, WARMUP_CLIP) for _ in range(pool.workers)]
+    if settings.stt_batch_window_ms > 0 and engine.supports_batching:
+        jobs.append(pool.transcribe_batch(settings.stt_engine, [WARMUP_CLIP, WARMUP_CLIP]))
+    await asyncio.gather(*jobs)
+
+
+def get_batcher(engine_name: str) -> STTBatcher:
+    global _batcher
+    if _batcher is None or _batcher.pool is not get_pool() or _batcher.engine_name != engine_name:
+        _batcher = STTBatcher(
+            get_pool(),
+            engine_name,
+            window_ms=settings.stt_batch_window_ms,
+            max_batch=settings.stt_max_batch
+        )
+    return _batcher
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def engine_chain() -> list:
+    """Primary engine followed by the configured fallbacks."""
+    fallbacks = [name.strip() for name in settings.stt_fallback_engines.split(",") if name.strip()]
+    return [settings.stt_engine] + [name for name in fallbacks if name != settings.stt_engine]
+
+
+async def transcribe_with_engine(engine_name: str, audio) -> tuple:
+    """Run one engine on a 16 kHz mono float32 array (or file path) -> (text, confidence)."""
+    engine = stt_engines.get_engine(engine_name)
     
-    # Calculate confidence from segments
-    segments = result.get("segments", [])
-    if segments:
-        avg_logprob = sum(s.get("avg_logprob", -1) for s in segments) / len(segments)
-        # Convert log probability to confidence (0-1 scale, -1 is ~0.37, 0 is 1.0)
-        confidence = min(1.0, max(0.0, 1.0 + avg_logprob))
-    else:
-        confidence = 0.5 
+    # Remote engines are I/O bound; don't take a model slot
+    if not engine.local:
+        return await asyncio.to_thread(engine.transcribe, audio)
     
-    return text, confidence
+    batchable = isinstance(audio, np.ndarray) and len(audio) <= WHISPER_WINDOW_SAMPLES
+    if settings.stt_batch_window_ms > 0 and engine.supports_batching and batchable:
+        return await get_batcher(engine_name).transcribe(audio)
+    return await get_pool().transcribe(engine_name, audio)
 
 
-async def transcribe_with_google(audio_path: str) -> str:
-    import speech_recognition as sr
-    
-    recognizer = sr.Recognizer()
+async def transcribe_with_whisper(audio) -> tuple:
+    return await transcribe_with_engine("whisper", audio)
 
-    def recognize():
-        with sr.AudioFile(audio_path) as source:
-            audio = recognizer.record(source)
-        return recognizer.recognize_google(audio)
 
-    text = await asyncio.to_thread(recognize)
-    return text.strip()
+async def transcribe_with_google(audio) -> str:
+    text, _ = await transcribe_with_engine("google", audio)
+    return text
 
 
-async def transcribe(audio_data: bytes, format_hint: str = None) -> str:
-    temp_path = None
+async def transcribe(audio, format_hint: str = None) -> str:
+    """Transcribe a DecodedAudio (or raw bytes, which are ingested here)."""
+    # Decode once in memory; no temp WAV and no second ffmpeg decode inside Whisper
+    if not isinstance(audio, DecodedAudio):
+        audio = await ingest_audio(audio, format_hint)
+    samples = audio.samples
     
-    # Confidence threshold - below this, ask user to repeat
-    CONFIDENCE_THRESHOLD = 0.4
+    # STT cost grows with clip length; don't pay for leading/trailing silence
+    if settings.stt_trim_silence:
+        samples = trim_silence(
+            samples,
+            audio.sample_rate,
+            min_rms=settings.vad_min_rms,
+            pad_ms=settings.stt_trim_pad_ms
+        )
+        trimmed = (len(audio.samples) - len(samples)) / audio.sample_rate
+        _trim["requests"] += 1
+        _trim["input_seconds"] += audio.duration
+        _trim["trimmed_seconds"] += trimmed
+        if len(samples) == 0:
+            _trim["no_speech"] += 1
+            logger.info(f"No speech in {audio.duration:.1f}s clip, skipping STT")
+            return NO_SPEECH
+        logger.info(f"Trimmed {trimmed:.2f}s of silence ({audio.duration:.1f}s -> {len(samples) / audio.sample_rate:.1f}s)")
     
-    try:
-        temp_path = await save_to_temp_wav(audio_data, format_hint)
-        
-        # Try Whisper first
+    # Primary engine first, then the fallbacks in order, skipping open breakers
+    chain = available(engine_chain(), "stt") or engine_chain()
+    last_error = None
+    for engine_name in chain:
+        breaker = get_breaker(f"stt:{engine_name}", settings.stt_slow_seconds)
+        start = time.perf_counter()
         try:
-            text, confidence = await transcribe_with_whisper(temp_path)
-            logger.info(f"Whisper: '{text[:50]}...' (confidence: {confidence:.2f})")
-            
-            # If confidence is too low, ask user to repeat
-            if confidence < CONFIDENCE_THRESHOLD and len(text) > 0:
-                logger.warning(f"Low confidence ({confidence:.2f}), asking to repeat")
-                return "[LOW_CONFIDENCE]"  # Special marker for orchestrator
-            
-            return text
+            text, confidence = await breaker.call(
+                transcribe_with_engine, engine_name, samples,
+                timeout=settings.stt_job_timeout_seconds,
+                ignore=(STTOverloadedError,)
+            )
+        except STTOverloadedError:
+            record_call("stt", engine_name, "overloaded")
+            raise
+        except CircuitOpenError as e:
+            record_call("stt", engine_name, "circuit_open")
+            last_error = e
+            continue
         except Exception as e:
-            logger.warning(f"Whisper failed: {e}, trying fallback...")
+            record_call("stt", engine_name, "error")
+            logger.warning(f"{engine_name} STT failed: {e!r}, trying fallback...")
+            last_error = e
+            continue
         
-        # Fallback to Google
-        text = await transcribe_with_google(temp_path)
-        logger.info(f"Google STT: '{text[:50]}...'")
-        return text
+        record_call("stt", engine_name, "success", time.perf_counter() - start)
+        if engine_name != settings.stt_engine:
+            record_fallback("stt", engine_name)
+        logger.info(f"{engine_name} STT: '{text[:50]}...' (confidence: {confidence:.2f})")
         
-    finally:
-        cleanup_temp_file(temp_path)
+        return _check_confidence(text, confidence)
+    
+    raise last_error
+
+
+def trim_stats() -> dict:
+    requests = _trim["requests"]
+    return {
+        "enabled": settings.stt_trim_silence,
+        "requests": requests,
+        "no_speech": _trim["no_speech"],
+        "trimmed_seconds": round(_trim["trimmed_seconds"], 2),
+        "trimmed_seconds_avg": round(_trim["trimmed_seconds"] / requests, 2) if requests else 0.0,
+        "trimmed_share": round(_trim["trimmed_seconds"] / _trim["input_seconds"], 3) if _trim["input_seconds"] else 0.0
+    }
+
+
+def _check_confidence(text: str, confidence: float) -> str:
+    # If confidence is too low, ask user to repeat
+    if confidence < CONFIDENCE_THRESHOLD and len(text) > 0:
+        logger.warning(f"Low confidence ({confidence:.2f}), asking to repeat")
+        return LOW_CONFIDENCE  # Special marker for orchestrator
+    return text
+
+
+def _words(text: str) -> list:
+    return text.split()
+
+
+def _agreement_key(word: str) -> str:
+    return "".join(c for c in word.lower() if c.isalnum())
+
+
+class StreamingTranscriber:
+    """Incremental transcription of one utterance (LocalAgreement-2).
+
+    Audio is appended while the user speaks; every ``step_seconds`` of new
+    audio the buffered window is decoded again, and the words two consecutive
+    hypotheses agree on are committed - they won't change any more. Once the
+    window grows past ``window_seconds`` the audio behind the last fully
+    committed segment is dropped, so each decode stays short. At end of
+    speech ``finish`` only has to decode that short tail.
+    """
+
+    def __init__(self, engine_name: str = None, step_seconds: float = None, window_seconds: float = None):
+        self.engine_name = engine_name or settings.stt_engine
+        self.step = int((step_seconds or settings.stt_stream_step_ms / 1000) * WHISPER_SAMPLE_RATE)
+        self.window = int((window_seconds or settings.stt_stream_window_seconds) * WHISPER_SAMPLE_RATE)
+        self.committed = []
+        self._confidences = []  # of segments that have left the window
+        self._chunks = []
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._decoded_len = 0
+        self._buffer_committed = 0  # committed words that fall inside the current window
+        self._hypothesis = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def committed_text(self) -> str:
+        return " ".join(self.committed)
+
+    @property
+    def partial_text(self) -> str:
+        return " ".join(self.committed + self._hypothesis[self._buffer_committed:])
+
+    def feed(self, samples: np.ndarray):
+        self._chunks.append(samples.astype(np.float32, copy=False))
+
+    def ready(self) -> bool:
+        """Enough new audio for another pass (and none running)."""
+        pending = sum(len(c) for c in self._chunks)
+        return not self._lock.locked() and len(self._audio) + pending - self._decoded_len >= self.step
+
+    async def update(self) -> bool:
+        """Decode the current window; returns True if more text was committed."""
+        async with self._lock:
+            before = len(self.committed)
+            segments = await self._decode()
+            words = [w for text, _, _, _ in segments for w in _words(text)]
+            
+            # Local agreement: the common prefix of the last two hypotheses is stable
+            agreed = 0
+            for old, new in zip(self._hypothesis, words):
+                if _agreement_key(old) != _agreement_key(new):
+                    break
+                agreed += 1
+            if agreed > self._buffer_committed:
+                self.committed += words[self._buffer_committed:agreed]
+                self._buffer_committed = agreed
+            self._hypothesis = words
+            
+            self._trim(segments)
+            return len(self.committed) > before
+
+    async def finish(self) -> str:
+        """Decode the remaining tail and return the whole utterance's transcript."""
+        async with self._lock:
+            segments = await self._decode()
+            words = [w for text, _, _, _ in segments for w in _words(text)]
+            text = " ".join(self.committed + words[self._buffer_committed:])
+            confidences = self._confidences + [conf for _, _, _, conf in segments]
+            confidence = sum(confidences) / len(confidences) if confidences else 0.5
+            return _check_confidence(text, confidence)
+
+    async def _decode(self) -> list:
+        if self._chunks:
+            self._audio = np.concatenate([self._audio, *self._chunks])
+            self._chunks = []
+        self._decoded_len = len(self._audio)
+        if len(self._audio) == 0:
+            return []
+        
+        return await get_pool().transcribe_segments(self.engine_name, self._audio)
+
+    def _trim(self, segments: list):
+        if len(self._audio) <= self.window:
+            return
+        # Cut after the last segment whose words are all committed
+        cut_words, cut_time = 0, 0.0
+        cut_confidences = []
+        for text, _, end, confidence in segments:
+            count = len(_words(text))
+            if cut_words + count > self._buffer_committed:
+                break
+            cut_words += count
+            cut_time = end
+            cut_confidences.append(confidence)
+        cut = int(cut_time * WHISPER_SAMPLE_RATE)
+        if cut <= 0:
+            return
+        self._confidences += cut_confidences
+        self._audio = self._audio[cut:]
+        self._decoded_len = max(0, self._decoded_len - cut)
+        self._hypothesis = self._hypothesis[cut_words:]
+        self._buffer_committed -= cut_words
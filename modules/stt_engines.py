@@ -0,0 +1,206 @@
+"""Speech-to-text engines.
+
+Every engine turns 16 kHz mono float32 samples (or a file path) into
+``(text, confidence)`` with confidence on a 0-1 scale, so the orchestrator's
+low-confidence handling doesn't care which engine ran. Engine methods are
+synchronous: local engines run on the STT worker pool, remote ones in a
+thread.
+"""
+import os
+import numpy as np
+
+from config import settings
+from utils.audio import WHISPER_SAMPLE_RATE
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cache directory for downloaded models
+MODEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache")
+
+# CPU threads per model replica (0 = library default); set by the worker pool
+_threads = 0
+
+_engines = {}
+
+
+def logprob_confidence(avg_logprobs: list) -> float:
+    if not avg_logprobs:
+        return 0.5
+    avg_logprob = sum(avg_logprobs) / len(avg_logprobs)
+    # Convert log probability to confidence (0-1 scale, -1 is ~0.37, 0 is 1.0)
+    return min(1.0, max(0.0, 1.0 + avg_logprob))
+
+
+def quantize_whisper(model):
+    """Apply PyTorch dynamic int8 quantization to Whisper's linear layers.
+
+    Weights are stored as int8 and activations quantized on the fly, which
+    cuts the attention/MLP matmul cost on CPU. Whisper wraps ``nn.Linear`` in
+    a subclass that only adds dtype casting, and ``quantize_dynamic`` matches
+    exact types, so those layers are turned back into plain ``nn.Linear``
+    first.
+    """
+    import torch
+
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class STTEngine:
+    name = ""
+    # Local engines burn our CPU and go through the worker pool
+    local = True
+    supports_batching = False
+
+    def load(self):
+        pass
+
+    def transcribe(self, audio) -> tuple:
+        raise NotImplementedError
+
+    def transcribe_segments(self, audio) -> list:
+        """[(text, start, end, confidence)]; engines without timestamps return one segment."""
+        text, confidence = self.transcribe(audio)
+        return [(text, 0.0, len(audio) / WHISPER_SAMPLE_RATE, confidence)] if text else []
+
+
+class WhisperEngine(STTEngine):
+    """openai-whisper on PyTorch."""
+    name = "whisper"
+    supports_batching = True
+    options = {"fp16": False, "language": "en"}
+
+    def __init__(self):
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            import whisper
+
+            cache_dir = os.path.join(MODEL_CACHE_DIR, "whisper")
+            os.makedirs(cache_dir, exist_ok=True)
+            logger.info(f"Loading Whisper model: {settings.whisper_model} (cache: {cache_dir})")
+            if settings.whisper_quantize:
+                # Quantized kernels are CPU-only
+                model = whisper.load_model(settings.whisper_model, device="cpu", download_root=cache_dir)
+                self.model = quantize_whisper(model)
+            else:
+                self.model = whisper.load_model(settings.whisper_model, download_root=cache_dir)
+            logger.info(f"Whisper loaded{' (int8 dynamic quantization)' if settings.whisper_quantize else ''}")
+        return self.model
+
+    def transcribe(self, audio) -> tuple:
+        result = self.load().transcribe(audio, **self.options)
+        segments = result.get("segments", [])
+        return result.get("text", "").strip(), logprob_confidence([s.get("avg_logprob", -1) for s in segments])
+
+    def transcribe_segments(self, audio) -> list:
+        result = self.load().transcribe(audio, **self.options)
+        return [
+            (s["text"].strip(), s["start"], s["end"], logprob_confidence([s.get("avg_logprob", -1)]))
+            for s in result.get("segments", [])
+        ]
+
+    def transcribe_batch(self, batch: list) -> list:
+        """One batched encoder/decoder pass over several clips of up to 30 s."""
+        import torch
+        import whisper
+
+        model = self.load()
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+            for audio in batch
+        ]).to(model.device)
+        decoded = whisper.decode(model, mels, whisper.DecodingOptions(without_timestamps=True, **self.options))
+        # One window per clip, so each result is a single segment
+        return [(r.text.strip(), logprob_confidence([r.avg_logprob])) for r in decoded]
+
+
+class FasterWhisperEngine(STTEngine):
+    """faster-whisper (CTranslate2), int8-quantized by default for CPU boxes."""
+    name = "faster-whisper"
+
+    def __init__(self):
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            from faster_whisper import WhisperModel
+
+            cache_dir = os.path.join(MODEL_CACHE_DIR, "faster-whisper")
+            logger.info(
+                f"Loading faster-whisper model: {settings.faster_whisper_model} "
+                f"({settings.faster_whisper_compute_type}, cache: {cache_dir})"
+            )
+            self.model = WhisperModel(
+                settings.faster_whisper_model,
+                device="cpu",
+                compute_type=settings.faster_whisper_compute_type,
+                cpu_threads=_threads,
+                download_root=cache_dir
+            )
+            logger.info("faster-whisper loaded")
+        return self.model
+
+    def transcribe(self, audio) -> tuple:
+        segments, _ = self.load().transcribe(audio, language="en")
+        segments = list(segments)  # decoding happens lazily while iterating
+        text = "".join(s.text for s in segments).strip()
+        return text, logprob_confidence([s.avg_logprob for s in segments])
+
+    def transcribe_segments(self, audio) -> list:
+        segments, _ = self.load().transcribe(audio, language="en")
+        return [(s.text.strip(), s.start, s.end, logprob_confidence([s.avg_logprob])) for s in segments]
+
+
+class GoogleEngine(STTEngine):
+    """Google Web Speech API via SpeechRecognition."""
+    name = "google"
+    local = False
+
+    def transcribe(self, audio) -> tuple:
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        if isinstance(audio, np.ndarray):
+            pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+            data = sr.AudioData(pcm, WHISPER_SAMPLE_RATE, 2)
+        else:
+            with sr.AudioFile(audio) as source:
+                data = recognizer.record(source)
+
+        result = recognizer.recognize_google(data, show_all=True)
+        if not result or not result.get("alternative"):
+            raise sr.UnknownValueError()
+        best = result["alternative"][0]
+        return best["transcript"].strip(), best.get("confidence", 1.0)
+
+
+ENGINES = {
+    WhisperEngine.name: WhisperEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+    GoogleEngine.name: GoogleEngine,
+}
+
+
+def get_engine(name: str) -> STTEngine:
+    """Return this process's instance of an engine (models load on first use)."""
+    engine = _engines.get(name)
+    if engine is None:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown STT engine: {name} (available: {', '.join(ENGINES)})")
+        engine = _engines[name] = ENGINES[name]()
+    return engine
+
+
+def set_threads(threads: int):
+    global _threads
+    _threads = threads
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
@@ -1,13 +1,193 @@
 import asyncio
+import hashlib
 import io
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
 from utils.logger import get_logger
-from utils.audio import convert_to_format
+from utils.audio import encode_audio, transcode_stream
+from utils.metrics import mark_stage, record_call, record_fallback
+from utils.resilience import get_breaker, CircuitOpenError
 from config import settings
 
 logger = get_logger(__name__)
 
+_cache = None
 
-async def synthesize_with_edge(text: str, voice: str = None, rate: str = None, volume: str = None) -> bytes:
+# Output formats each provider can produce without conversion. edge-tts pins
+# the Edge output format to 24 kHz mp3 and only accepts audio/mpeg frames,
+# so anything else is encoded locally.
+NATIVE_FORMATS = {
+    "edge": {"mp3"},
+    "gtts": {"mp3"}
+}
+
+# Per output format: responses, bytes sent, how they were produced and encoder CPU
+_format_stats = {}
+
+
+class TTSCache:
+    """Content-addressed synthesized audio: an in-memory LRU with a byte
+    budget in front of an optional size-bounded directory on disk.
+
+    Pinned entries (pre-rendered fixed phrases) are never evicted from
+    memory, so the error and fallback replies don't depend on the network.
+    """
+
+    def __init__(self, memory_bytes: int, disk_dir: str = "", disk_bytes: int = 0):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._pinned = {}
+        self._size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice: str, rate: str, volume: str, output_format: str) -> str:
+        raw = "\0".join([text.strip(), voice, rate, volume, output_format])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries) + len(self._pinned),
+            "pinned": len(self._pinned),
+            "memory_bytes": self._size,
+            "memory_budget": self.memory_bytes,
+            "disk": bool(self.disk_dir),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+        }
+
+    async def get(self, key: str, *alternatives: str) -> Optional[bytes]:
+        """The clip under ``key``, else under the first cached alternative;
+        counts one hit or miss either way."""
+        for candidate in (key, *alternatives):
+            audio, tier = await self.lookup(candidate)
+            if audio is not None:
+                break
+        if tier == "memory":
+            self.hits += 1
+        elif tier == "disk":
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+        return audio
+
+    async def lookup(self, key: str) -> tuple:
+        """(audio, tier) without touching the hit/miss counters."""
+        audio = self._pinned.get(key)
+        if audio is None:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+        if audio is not None:
+            return audio, "memory"
+        
+        if self.disk_dir:
+            audio = await asyncio.to_thread(self._read_disk, key)
+            if audio is not None:
+                self._remember(key, audio)
+                return audio, "disk"
+        
+        return None, None
+
+    async def put(self, key: str, audio: bytes, pin: bool = False):
+        if pin:
+            self._pinned[key] = audio
+        else:
+            self._remember(key, audio)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, audio)
+
+    def _remember(self, key: str, audio: bytes):
+        if key in self._pinned or len(audio) > self.memory_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = audio
+        self._size += len(audio)
+        while self._size > self.memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = os.path.join(self.disk_dir, key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # mtime doubles as last-used time for eviction
+            return audio
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = os.path.join(self.disk_dir, key)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"TTS disk cache write failed: {e}")
+
+    def _evict_disk(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+def get_cache() -> TTSCache:
+    global _cache
+    if _cache is None:
+        _cache = TTSCache(
+            memory_bytes=int(settings.tts_cache_memory_mb * 1024 * 1024),
+            disk_dir=settings.tts_cache_dir,
+            disk_bytes=int(settings.tts_cache_disk_mb * 1024 * 1024)
+        )
+    return _cache
+
+
+def _bitrate(output_format: str) -> Optional[int]:
+    return settings.tts_opus_bitrate_kbps if output_format == "opus" else None
+
+
+def _cache_key(text: str, output_format: str, streamed: bool = False) -> str:
+    # ffmpeg's streamed output isn't byte-identical to encode_audio's
+    encoder = "+ffmpeg" if streamed and output_format not in NATIVE_FORMATS["edge"] else ""
+    # A bitrate change must not serve clips encoded at the old one
+    if output_format == "opus":
+        output_format = f"opus@{settings.tts_opus_bitrate_kbps}k"
+    output_format += encoder
+    return TTSCache.key(text, settings.tts_voice, settings.tts_rate, settings.tts_volume, output_format)
+
+
+async def stream_with_edge(
+    text: str,
+    voice: str = None,
+    rate: str = None,
+    volume: str = None
+) -> AsyncIterator[bytes]:
+    """Yield Edge TTS mp3 chunks as they arrive."""
     import edge_tts
     
     voice = voice or settings.tts_voice
@@ -16,51 +196,239 @@ async def synthesize_with_edge(text: str, voice: str = None, rate: str = None, v
     
     communicate = edge_tts.Communicate(text=text, voice=voice, rate=rate, volume=volume)
     
-    chunks = []
     async for chunk in communicate.stream():
         if chunk["type"] == "audio":
-            chunks.append(chunk["data"])
-    
-    return b"".join(chunks)
+            yield chunk["data"]
+
+
+async def synthesize_with_edge(text: str, voice: str = None, rate: str = None, volume: str = None) -> bytes:
+    return b"".join([chunk async for chunk in stream_with_edge(text, voice, rate, volume)])
 
 
 async def synthesize_with_gtts(text: str) -> bytes:
     from gtts import gTTS
     
-    loop = asyncio.get_event_loop()
-    
     def synthesize():
         tts = gTTS(text=text, lang="en")
         buf = io.BytesIO()
         tts.write_to_fp(buf)
         return buf.getvalue()
 
-    audio_bytes = await asyncio.to_thread(synthesize)
+    return await asyncio.to_thread(synthesize)
+
+
+# Fallback order; providers with an open breaker are skipped without a call
+PROVIDERS = {
+    "edge": synthesize_with_edge,
+    "gtts": synthesize_with_gtts
+}
+
+
+def _breaker(provider: str):
+    return get_breaker(f"tts:{provider}", settings.tts_slow_seconds)
+
+
+async def _synthesize_mp3(text: str) -> tuple:
+    """(mp3, provider) from the first provider that is up and answers in time."""
+    last_error = None
+    for index, (provider, synthesizer) in enumerate(PROVIDERS.items()):
+        start = time.perf_counter()
+        try:
+            audio = await _breaker(provider).call(synthesizer, text, timeout=settings.tts_timeout_seconds)
+        except CircuitOpenError as e:
+            record_call("tts", provider, "circuit_open")
+            last_error = e
+            continue
+        except Exception as e:
+            record_call("tts", provider, "error")
+            logger.warning(f"{provider} TTS failed: {e!r}, trying next provider...")
+            last_error = e
+            continue
+        
+        record_call("tts", provider, "success", time.perf_counter() - start)
+        if index:
+            record_fallback("tts", provider)
+        logger.info(f"{provider} TTS: {len(audio)} bytes")
+        return audio, provider
+    raise last_error
 
 
 async def synthesize(text: str, output_format: str = "mp3") -> bytes:
     if not text or not text.strip():
         raise ValueError("Text cannot be empty")
     
-    audio = None
+    cache = get_cache()
+    key = _cache_key(text, output_format)
+    audio = await cache.get(key)
+    if audio is not None:
+        _record_format(output_format, len(audio), "cached")
+        mark_stage("cached")
+        return audio
+    
+    audio, cacheable = await _synthesize_uncached(text, output_format)
+    if cacheable:
+        await cache.put(key, audio)
+    return audio
+
+
+async def _synthesize_uncached(text: str, output_format: str) -> tuple:
+    """Returns (audio, cacheable); gTTS output isn't cached under the Edge voice key."""
+    audio, provider = await _synthesize_mp3(text)
+    cacheable = provider == "edge"
+    
+    if output_format in NATIVE_FORMATS[provider]:
+        _record_format(output_format, len(audio), "native")
+        return audio, cacheable
+    
+    audio, cpu = await _encode(audio, output_format)
+    _record_format(output_format, len(audio), "converted", cpu)
+    return audio, cacheable
+
+
+def _timed_encode(audio: bytes, output_format: str) -> tuple:
+    start = time.thread_time()
+    audio = encode_audio(audio, output_format, _bitrate(output_format))
+    return audio, time.thread_time() - start
+
+
+async def _encode(audio: bytes, output_format: str) -> tuple:
+    """(audio, cpu_seconds) re-encoded in a worker thread, off the event loop."""
+    return await asyncio.to_thread(_timed_encode, audio, output_format)
+
+
+def _record_format(output_format: str, size: int, source: str, cpu: float = 0.0):
+    stats = _format_stats.setdefault(
+        output_format,
+        {"responses": 0, "bytes": 0, "native": 0, "converted": 0, "streamed": 0, "cached": 0, "cpu_ms": 0.0}
+    )
+    stats["responses"] += 1
+    stats["bytes"] += size
+    stats[source] += 1
+    stats["cpu_ms"] += cpu * 1000
+
+
+def format_stats() -> dict:
+    """Per output format totals and per-response averages. "converted" are
+    in-process encodes, "streamed" went through ffmpeg; CPU covers both
+    (ffmpeg's is read from /proc, so it's 0 off Linux)."""
+    result = {}
+    for output_format, stats in sorted(_format_stats.items()):
+        responses = stats["responses"]
+        converted = stats["converted"] + stats["streamed"]
+        result[output_format] = {
+            **stats,
+            "cpu_ms": round(stats["cpu_ms"], 1),
+            "avg_bytes": round(stats["bytes"] / responses) if responses else 0,
+            "avg_cpu_ms_per_conversion": round(stats["cpu_ms"] / converted, 2) if converted else 0.0
+        }
+    return result
+
+
+async def prerender(phrases: list, formats: list):
+    """Render fixed phrases into the cache (pinned) so they never hit the network."""
+    cache = get_cache()
+    
+    async def render(text: str, output_format: str):
+        key = _cache_key(text, output_format)
+        try:
+            # A disk copy from a previous run saves the round trip
+            audio, _ = await cache.lookup(key)
+            if audio is None:
+                audio = await _breaker("edge").call(synthesize_with_edge, text, timeout=settings.tts_timeout_seconds)
+                if output_format not in NATIVE_FORMATS["edge"]:
+                    audio, _ = await _encode(audio, output_format)
+            await cache.put(key, audio, pin=True)
+            return True
+        except Exception as e:
+            logger.warning(f"Pre-render failed for '{text[:30]}...' ({output_format}): {e}")
+            return False
     
-    # Try Edge TTS first
+    results = await asyncio.gather(*[render(text, fmt) for text in dict.fromkeys(phrases) for fmt in formats])
+    logger.info(f"TTS cache pre-rendered: {sum(results)}/{len(results)} clips")
+    if not all(results):
+        raise RuntimeError(f"{results.count(False)} of {len(results)} clips failed to pre-render")
+
+
+async def _stream_mp3(text: str, status: dict) -> AsyncIterator[bytes]:
+    breaker = _breaker("edge")
+    if breaker.allow():
+        chunks = stream_with_edge(text)
+        start = time.monotonic()
+        started = False
+        try:
+            # The per-call timeout bounds the wait for the first chunk
+            first = await asyncio.wait_for(anext(chunks), settings.tts_timeout_seconds)
+            breaker.record(True, time.monotonic() - start)
+            record_call("tts", "edge", "success", time.monotonic() - start)
+            started = True
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            return
+        except StopAsyncIteration:
+            breaker.record(False, time.monotonic() - start)
+            record_call("tts", "edge", "error")
+            logger.warning("Edge TTS returned no audio, trying gTTS...")
+        except asyncio.CancelledError:
+            if not started:
+                breaker.release()
+                record_call("tts", "edge", "cancelled")
+            raise
+        except Exception as e:
+            # Once bytes have gone out we can't switch engines mid-clip
+            if started:
+                raise
+            breaker.record(False, time.monotonic() - start)
+            record_call("tts", "edge", "error")
+            logger.warning(f"Edge TTS failed: {e!r}, trying gTTS...")
+    else:
+        record_call("tts", "edge", "circuit_open")
+    
+    status["fallback"] = True
+    start = time.monotonic()
     try:
-        audio = await synthesize_with_edge(text)
-        logger.info(f"Edge TTS: {len(audio)} bytes")
+        audio = await _breaker("gtts").call(synthesize_with_gtts, text, timeout=settings.tts_timeout_seconds)
     except Exception as e:
-        logger.warning(f"Edge TTS failed: {e}, trying gTTS...")
+        record_call("tts", "gtts", "circuit_open" if isinstance(e, CircuitOpenError) else "error")
+        raise
+    record_call("tts", "gtts", "success", time.monotonic() - start)
+    record_fallback("tts", "gtts")
+    yield audio
+
+
+async def synthesize_stream(text: str, output_format: str = "mp3") -> AsyncIterator[bytes]:
+    """Yield audio chunks while synthesis is still running."""
+    if not text or not text.strip():
+        raise ValueError("Text cannot be empty")
     
-    # Fallback to gTTS
-    if audio is None:
-        audio = await synthesize_with_gtts(text)
-        logger.info(f"gTTS: {len(audio)} bytes")
+    cache = get_cache()
+    key = _cache_key(text, output_format, streamed=True)
+    # A whole-clip encode (e.g. a pre-rendered reply) is just as playable
+    audio = await cache.get(key, _cache_key(text, output_format))
+    if audio is not None:
+        _record_format(output_format, len(audio), "cached")
+        yield audio
+        return
     
-    # Convert format if needed
-    if output_format != "mp3":
-        audio = await convert_to_format(audio, output_format)
+    status = {"fallback": False}
+    chunks = _stream_mp3(text, status)
     
-    return audio
+    # Both providers stream mp3; transcode incrementally instead of waiting
+    # for the whole clip
+    native = output_format in NATIVE_FORMATS["edge"]
+    transcode = {"cpu_seconds": 0.0}
+    if not native:
+        chunks = transcode_stream(chunks, output_format, bitrate_kbps=_bitrate(output_format), stats=transcode)
+    
+    # Keep a copy so repeated sentences are served from the cache next time
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    audio = b"".join(parts)
+    _record_format(output_format, len(audio), "native" if native else "streamed", transcode["cpu_seconds"])
+    if not status["fallback"]:
+        await cache.put(key, audio)
 
 
 async def list_voices():
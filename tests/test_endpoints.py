@@ -0,0 +1,52 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi.testclient import TestClient
+
+import main
+from modules import llm, stt, tts
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def transcribe(audio, format_hint=None):
+        return "Tell me about yourself."
+
+    async def generate(text, session_id):
+        return "I build voice assistants."
+
+    async def synthesize(text, output_format="mp3"):
+        return b"audio:" + text.encode()
+
+    monkeypatch.setattr(stt, "transcribe", transcribe)
+    monkeypatch.setattr(llm, "generate", generate)
+    monkeypatch.setattr(tts, "synthesize", synthesize)
+    return TestClient(main.app)
+
+
+def wav_clip() -> bytes:
+    t = np.arange(16000) / 16000
+    out = io.BytesIO()
+    sf.write(out, (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), 16000, format="WAV")
+    return out.getvalue()
+
+
+def test_voice_process_full_returns_audio(client):
+    response = client.post("/api/voice/process-full", files={"audio": ("clip.wav", wav_clip(), "audio/wav")})
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"]
+    assert base64.b64decode(body["audio_base64"])
+
+
+def test_text_chat_full_returns_audio(client):
+    response = client.post("/api/text/chat-full", json={"text": "Tell me about yourself."})
+    
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"]
+    assert base64.b64decode(body["audio_base64"])
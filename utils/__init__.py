@@ -3,18 +3,42 @@
 from utils.logger import get_logger, setup_logging
 from utils.audio import (
     load_audio,
+    load_audio_16k,
+    ingest_audio,
+    ingest_samples,
+    DecodedAudio,
+    resample,
     save_to_temp_wav,
     convert_to_format,
+    encode_audio,
+    transcode_stream,
     cleanup_temp_file,
-    get_audio_duration
+    get_audio_duration,
+    pcm16_to_float,
+    float_to_wav,
+    frame_rms,
+    trim_silence,
+    VoiceActivityDetector
 )
 
 __all__ = [
     "get_logger",
     "setup_logging",
     "load_audio",
+    "load_audio_16k",
+    "ingest_audio",
+    "ingest_samples",
+    "DecodedAudio",
+    "resample",
     "save_to_temp_wav",
     "convert_to_format",
+    "encode_audio",
+    "transcode_stream",
     "cleanup_temp_file",
-    "get_audio_duration"
+    "get_audio_duration",
+    "pcm16_to_float",
+    "float_to_wav",
+    "frame_rms",
+    "trim_silence",
+    "VoiceActivityDetector"
 ]
@@ -1,6 +1,10 @@
 import io
+import math
 import os
+import asyncio
 import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
 import numpy as np
 import soundfile as sf
 from pydub import AudioSegment
@@ -9,6 +13,26 @@ from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Whisper's native input rate
+WHISPER_SAMPLE_RATE = 16000
+
+# Output formats libsndfile can encode in-process: (container, codec)
+SOUNDFILE_FORMATS = {
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+    "wav": ("WAV", "PCM_16"),
+    "ogg": ("OGG", "VORBIS"),
+    "opus": ("OGG", "OPUS"),
+    "flac": ("FLAC", "PCM_16")
+}
+
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def opus_compression_level(bitrate_kbps: int) -> float:
+    """libsndfile maps compression level 0..1 linearly onto 256..6 kbps per channel."""
+    bitrate = min(max(bitrate_kbps, 6), 256)
+    return 1.0 - (bitrate - 6) / 250
+
 
 async def load_audio(audio_data: bytes):
     # Try soundfile first 
@@ -29,6 +53,92 @@ async def load_audio(audio_data: bytes):
         return samples, audio.frame_rate
 
 
+def _fft_size(blocks: int) -> int:
+    """Smallest 2/3/5-smooth integer >= blocks; pocketfft is slow on large primes."""
+    while True:
+        rest = blocks
+        for factor in (2, 3, 5):
+            while rest % factor == 0:
+                rest //= factor
+        if rest == 1:
+            return blocks
+        blocks += 1
+
+
+def resample(samples: np.ndarray, orig_rate: int, target_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """Band-limited (FFT) resampling: everything above the lower Nyquist is
+    dropped before the rate changes, so e.g. 44.1 kHz content above 8 kHz
+    can't alias into the speech band."""
+    if orig_rate == target_rate:
+        return samples
+    
+    divisor = math.gcd(orig_rate, target_rate)
+    up, down = target_rate // divisor, orig_rate // divisor
+    out_len = len(samples) * up // down
+    if out_len == 0:
+        return np.zeros(0, dtype=np.float32)
+    
+    # Zero-pad to whole blocks of `down` samples so the output length is exact
+    blocks = _fft_size(-(-len(samples) // down))
+    spectrum = np.fft.rfft(samples, blocks * down)
+    keep = blocks * min(up, down) // 2 + 1
+    spectrum = spectrum[:keep]
+    # Raised-cosine roll-off over the top 5% of the band instead of a brick wall (less ringing)
+    taper = max(1, keep // 20)
+    spectrum[-taper:] *= 0.5 + 0.5 * np.cos(np.linspace(0, np.pi, taper))
+    out = np.fft.irfft(spectrum, blocks * up) * (up / down)
+    return out[:out_len].astype(np.float32)
+
+
+@dataclass
+class DecodedAudio:
+    """An upload decoded once: 16 kHz mono float32 samples plus what we know about it."""
+    samples: np.ndarray
+    sample_rate: int
+    duration: float
+    format: Optional[str] = None
+
+
+def ingest_samples(samples: np.ndarray, sampling_rate: int, format: str = "pcm") -> DecodedAudio:
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    samples = resample(samples.astype(np.float32, copy=False), sampling_rate)
+    return DecodedAudio(samples, WHISPER_SAMPLE_RATE, len(samples) / WHISPER_SAMPLE_RATE, format)
+
+
+def _decode(audio_data: bytes, format_hint: str = None) -> DecodedAudio:
+    try:
+        with io.BytesIO(audio_data) as buf, sf.SoundFile(buf) as f:
+            samples = f.read(dtype="float32")
+            sampling_rate = f.samplerate
+            audio_format = f.format.lower()
+    except Exception:
+        # Formats libsndfile can't read (mp3 on old builds, m4a, webm) still need ffmpeg
+        with io.BytesIO(audio_data) as buf:
+            audio = AudioSegment.from_file(buf, format=format_hint)
+        samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+        samples /= 2 ** (audio.sample_width * 8 - 1)
+        samples = samples.reshape((-1, audio.channels))
+        sampling_rate = audio.frame_rate
+        audio_format = format_hint
+    
+    return ingest_samples(samples, sampling_rate, audio_format)
+
+
+async def ingest_audio(audio_data: bytes, format_hint: str = None) -> DecodedAudio:
+    """Decode raw upload bytes once, off the event loop.
+
+    The result serves the duration check, Whisper (which takes the array
+    directly) and the Google fallback, so nothing decodes the bytes again.
+    """
+    return await asyncio.to_thread(_decode, audio_data, format_hint)
+
+
+async def load_audio_16k(audio_data: bytes) -> np.ndarray:
+    """Decode once, in memory, to the 16 kHz mono float32 array Whisper takes directly."""
+    return (await ingest_audio(audio_data)).samples
+
+
 async def save_to_temp_wav(audio_data: bytes, format_hint: str = None) -> str:
     temp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
     temp_path = temp.name
@@ -39,15 +149,123 @@ async def save_to_temp_wav(audio_data: bytes, format_hint: str = None) -> str:
     return temp_path
 
 
-async def convert_to_format(audio_data: bytes, output_format: str = "mp3") -> bytes:
+def encode_audio(audio_data: bytes, output_format: str, bitrate_kbps: Optional[int] = None) -> bytes:
+    """Re-encode compressed audio to another format (blocking; run it in a thread).
+
+    libsndfile decodes mp3 and encodes wav/ogg/opus/flac in-process; pydub
+    (an ffmpeg subprocess) only handles what it can't. ``bitrate_kbps``
+    applies to opus.
+    """
+    container = SOUNDFILE_FORMATS.get(output_format)
+    if container is not None:
+        try:
+            with io.BytesIO(audio_data) as buf:
+                samples, sampling_rate = sf.read(buf, dtype="float32")
+            options = {}
+            if output_format == "opus":
+                # Speech replies: mono, at a rate Opus accepts
+                if samples.ndim > 1:
+                    samples = samples.mean(axis=1, dtype=np.float32)
+                if sampling_rate not in OPUS_SAMPLE_RATES:
+                    samples = resample(samples, sampling_rate, 24000)
+                    sampling_rate = 24000
+                if bitrate_kbps:
+                    options["compression_level"] = opus_compression_level(bitrate_kbps)
+            out = io.BytesIO()
+            sf.write(out, samples, sampling_rate, format=container[0], subtype=container[1], **options)
+            return out.getvalue()
+        except Exception as e:
+            logger.debug(f"soundfile can't convert to {output_format} ({e}), using pydub")
+    
     with io.BytesIO(audio_data) as buf:
         audio = AudioSegment.from_file(buf)
-    
     out = io.BytesIO()
-    audio.export(out, format=output_format)
+    if output_format == "opus":
+        audio.export(out, format="ogg", codec="libopus", bitrate=f"{bitrate_kbps}k" if bitrate_kbps else None)
+    else:
+        audio.export(out, format=output_format)
     return out.getvalue()
 
 
+async def convert_to_format(audio_data: bytes, output_format: str = "mp3", bitrate_kbps: Optional[int] = None) -> bytes:
+    return await asyncio.to_thread(encode_audio, audio_data, output_format, bitrate_kbps)
+
+
+def _process_cpu(pid: int) -> Optional[float]:
+    """utime + stime in seconds of a running or not yet reaped process
+    (Linux /proc; None elsewhere or once it's gone)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def transcode_stream(
+    chunks: AsyncIterator[bytes],
+    output_format: str,
+    input_format: str = "mp3",
+    bitrate_kbps: Optional[int] = None,
+    stats: Optional[dict] = None
+) -> AsyncIterator[bytes]:
+    """Pipe an audio stream through ffmpeg, yielding output while input still arrives.
+
+    If ``stats`` is given, ffmpeg's CPU time is stored in its "cpu_seconds"
+    once the stream completes.
+    """
+    if output_format == "opus":
+        output_args = ["-f", "ogg", "-c:a", "libopus", "-application", "voip"]
+    else:
+        output_args = ["-f", output_format]
+    if bitrate_kbps:
+        output_args += ["-b:a", f"{bitrate_kbps}k"]
+    
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-loglevel", "error",
+        "-f", input_format, "-i", "pipe:0",
+        *output_args, "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE
+    )
+    
+    async def feed():
+        try:
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        finally:
+            proc.stdin.close()
+    
+    feeder = asyncio.create_task(feed())
+    cpu = None
+    
+    def sample_cpu():
+        # Sampled as output arrives: the child watcher may reap ffmpeg (and
+        # its /proc entry) before we get to read it at the end
+        nonlocal cpu
+        if stats is not None:
+            current = _process_cpu(proc.pid)
+            if current is not None:
+                cpu = current
+    
+    try:
+        while data := await proc.stdout.read(16384):
+            sample_cpu()
+            yield data
+        sample_cpu()
+        await feeder
+        if await proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode}")
+        if stats is not None and cpu is not None:
+            stats["cpu_seconds"] = cpu
+    finally:
+        feeder.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
 def cleanup_temp_file(path: str):
     try:
         if path and os.path.exists(path):
@@ -63,3 +281,182 @@ async def get_audio_duration(audio_data: bytes) -> float:
             return len(audio) / 1000.0
     except:
         return 0.0
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+class PCM16Stream:
+    """Decodes 16-bit PCM arriving in chunks cut at arbitrary byte
+    boundaries; an odd trailing byte is held for the next chunk."""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data: bytes) -> np.ndarray:
+        data = self._pending + data
+        whole = len(data) - len(data) % 2
+        self._pending = data[whole:]
+        return pcm16_to_float(data[:whole])
+
+
+def float_to_wav(samples: np.ndarray, sampling_rate: int) -> bytes:
+    buf = io.BytesIO()
+    sf.write(buf, samples, sampling_rate, format="WAV", subtype="PCM_16")
+    return buf.getvalue()
+
+
+def frame_rms(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS level of every complete frame, computed in one pass."""
+    count = len(samples) // frame_len
+    frames = samples[:count * frame_len].reshape(count, frame_len)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+
+
+def trim_silence(
+    samples: np.ndarray,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+    frame_ms: int = 20,
+    min_rms: float = 0.01,
+    noise_ratio: float = 3.0,
+    min_speech_ms: int = 60,
+    pad_ms: int = 200
+) -> np.ndarray:
+    """Cut leading and trailing silence from a whole clip.
+
+    A frame is voiced when its RMS is above both ``min_rms`` and
+    ``noise_ratio`` times the clip's noise floor (10th percentile frame).
+    Speech is the span from the first to the last run of ``min_speech_ms``
+    voiced frames, padded by ``pad_ms``. Returns an empty array only when no
+    frame reaches ``min_rms``; a clip that is loud throughout (no quieter
+    floor to measure against) comes back untrimmed. Everything is
+    vectorized over frames.
+    """
+    frame_len = sample_rate * frame_ms // 1000
+    levels = frame_rms(samples, frame_len)
+    if len(levels) == 0 or not np.any(levels > min_rms):
+        return samples[:0]
+    
+    threshold = max(min_rms, float(np.percentile(levels, 10)) * noise_ratio)
+    run = max(1, min_speech_ms // frame_ms)
+    # Frames that start a run of `run` consecutive voiced frames (single clicks don't count)
+    runs = np.convolve((levels > threshold).astype(np.int32), np.ones(run, dtype=np.int32), mode="valid") == run
+    starts = np.flatnonzero(runs)
+    if len(starts) == 0:
+        # Above the absolute floor but no run stands out from the clip's own
+        # level: let the engine decide rather than dropping the utterance
+        return samples
+    
+    pad = pad_ms // frame_ms
+    first = max(0, starts[0] - pad) * frame_len
+    last = min(len(levels), starts[-1] + run + pad) * frame_len
+    # Keep the partial frame at the end if speech runs up to it
+    if starts[-1] + run + pad >= len(levels):
+        last = len(samples)
+    return samples[first:last]
+
+
+class VoiceActivityDetector:
+    """Energy-based end-pointing for a live audio stream.
+
+    Feed float32 mono samples as they arrive. Speech starts after
+    ``start_ms`` of frames above the adaptive noise threshold and ends after
+    ``end_silence_ms`` below it; ``feed`` then returns the utterance samples
+    (with a short pre-roll) in an ``("end", samples)`` event. With
+    ``emit_audio`` the utterance is also handed out while it is spoken, as
+    ``("audio", samples)`` events between "start" and "end".
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        min_rms: float = 0.01,
+        noise_ratio: float = 3.0,
+        start_ms: int = 60,
+        end_silence_ms: int = 600,
+        pre_roll_ms: int = 200,
+        max_utterance_seconds: float = 90,
+        emit_audio: bool = False
+    ):
+        self.emit_audio = emit_audio
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.min_rms = min_rms
+        self.noise_ratio = noise_ratio
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.max_frames = int(max_utterance_seconds * 1000 / frame_ms)
+        self.noise_rms = 0.0
+        self.in_speech = False
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._frames = []
+        self._voiced_run = 0
+        self._silent_run = 0
+
+    def feed(self, samples: np.ndarray) -> list:
+        samples = np.concatenate([self._pending, samples])
+        count = len(samples) // self.frame_len
+        self._pending = samples[count * self.frame_len:]
+        if count == 0:
+            return []
+        
+        frames = samples[:count * self.frame_len].reshape(count, self.frame_len)
+        levels = frame_rms(frames.ravel(), self.frame_len)
+        
+        events = []
+        spoken = []
+        
+        def flush_spoken():
+            if spoken:
+                events.append(("audio", np.concatenate(spoken)))
+                spoken.clear()
+        
+        for frame, level in zip(frames, levels):
+            voiced = level > max(self.min_rms, self.noise_rms * self.noise_ratio)
+            self._frames.append(frame)
+            
+            if not self.in_speech:
+                if voiced:
+                    self._voiced_run += 1
+                else:
+                    self._voiced_run = 0
+                    self.noise_rms = 0.95 * self.noise_rms + 0.05 * float(level)
+                
+                if self._voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self._silent_run = 0
+                    events.append(("start", None))
+                    if self.emit_audio:
+                        spoken.extend(self._frames)
+                else:
+                    # Idle: only keep the pre-roll and the candidate onset
+                    keep = self.pre_roll_frames + self._voiced_run
+                    if len(self._frames) > keep:
+                        del self._frames[:len(self._frames) - keep]
+            else:
+                if self.emit_audio:
+                    spoken.append(frame)
+                self._silent_run = 0 if voiced else self._silent_run + 1
+                if self._silent_run >= self.end_frames or len(self._frames) >= self.max_frames:
+                    flush_spoken()
+                    events.append(("end", self._end_utterance()))
+        
+        flush_spoken()
+        return events
+
+    def flush(self) -> list:
+        """Force the end of the current utterance (e.g. client stopped sending)."""
+        return [("end", self._end_utterance())] if self.in_speech else []
+
+    def _end_utterance(self) -> np.ndarray:
+        # Drop the trailing silence that triggered the end, keeping ~100 ms
+        tail = max(0, self._silent_run - 5)
+        utterance = np.concatenate(self._frames[:len(self._frames) - tail])
+        self.in_speech = False
+        self._frames = []
+        self._voiced_run = 0
+        self._silent_run = 0
+        return utterance
+
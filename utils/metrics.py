@@ -0,0 +1,99 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from utils.profiling import record_span
+
+# Voice turns span ~50 ms (cache hits) to tens of seconds (long STT)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "voicegraph_stage_duration_seconds",
+    "Pipeline stage latency",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_OUTCOMES = Counter(
+    "voicegraph_stage_outcomes_total",
+    "Pipeline stage results (success, fallback, cached, low_confidence, no_speech, error)",
+    ["stage", "outcome"]
+)
+STAGE_IN_FLIGHT = Gauge(
+    "voicegraph_stage_in_flight",
+    "Pipeline stages currently running",
+    ["stage"]
+)
+PROVIDER_SECONDS = Histogram(
+    "voicegraph_provider_duration_seconds",
+    "Successful provider call latency (time to first token for LLMs)",
+    ["kind", "provider"],
+    buckets=LATENCY_BUCKETS
+)
+PROVIDER_CALLS = Counter(
+    "voicegraph_provider_calls_total",
+    "Provider calls by result (success, error, circuit_open, overloaded, cancelled)",
+    ["kind", "provider", "outcome"]
+)
+FALLBACKS = Counter(
+    "voicegraph_fallbacks_total",
+    "Requests served by a provider other than the primary",
+    ["kind", "provider"]
+)
+
+# The running stage's result, so provider code deep below can mark a fallback
+_stage_result: ContextVar[Optional[dict]] = ContextVar("stage_result", default=None)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a pipeline stage and count its outcome.
+
+    Yields a dict whose "outcome" the caller may overwrite; an exception
+    counts as "error".
+    """
+    in_flight = STAGE_IN_FLIGHT.labels(stage)
+    result = {"outcome": "success"}
+    previous = _stage_result.get()
+    _stage_result.set(result)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield result
+    except BaseException:
+        result["outcome"] = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        record_span(stage, start, elapsed)
+        STAGE_OUTCOMES.labels(stage, result["outcome"]).inc()
+        in_flight.dec()
+        # Not reset(token): a streamed stage may finish in another task's context
+        _stage_result.set(previous)
+
+
+def record_call(kind: str, provider: str, outcome: str, seconds: float = None):
+    PROVIDER_CALLS.labels(kind, provider, outcome).inc()
+    if seconds is not None and outcome == "success":
+        PROVIDER_SECONDS.labels(kind, provider).observe(seconds)
+
+
+def mark_stage(outcome: str):
+    """Set the enclosing stage's outcome (if any), unless it's already set."""
+    result = _stage_result.get()
+    if result is not None and result["outcome"] == "success":
+        result["outcome"] = outcome
+
+
+def record_fallback(kind: str, provider: str):
+    """Count a request served by a non-primary provider (or a canned reply)."""
+    FALLBACKS.labels(kind, provider).inc()
+    mark_stage("fallback")
+
+
+def render() -> tuple:
+    """(body, content type) in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
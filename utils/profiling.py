@@ -0,0 +1,229 @@
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Runtime switch (admin toggle); PROFILING sets the initial value
+_state = {"enabled": settings.profiling_enabled, "sample_rate": settings.profiling_sample_rate}
+_profiles = deque(maxlen=settings.profiling_buffer)
+_tracing = 0  # profiles currently holding tracemalloc on
+
+_active: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+
+MAX_STACK_DEPTH = 64
+TOP_ALLOCATIONS = 25
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler(threading.Thread):
+    """Samples every thread's Python stack every ``interval`` seconds into
+    collapsed-stack counts ("thread;outer;...;inner" -> samples), the input
+    format of flamegraph.pl and speedscope.
+
+    Covers the event loop and worker threads (to_thread encoders, the STT
+    thread pool); STT worker processes aren't visible from here.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or names.get(ident, "").startswith("profiler"):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profile:
+    """CPU samples, allocation peak and stage timings for one request.
+
+    Samples and the allocation peak are process-wide, so requests running
+    alongside a profiled one show up in its profile too.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.created = time.time()
+        self.spans = []
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._sampler = StackSampler(settings.profiling_interval_ms / 1000)
+
+    def start(self):
+        global _tracing
+        if _tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing += 1
+        tracemalloc.reset_peak()
+        self._sampler.start()
+
+    def finish(self, status: Optional[int]) -> dict:
+        global _tracing
+        self._sampler.stop()
+        duration = time.perf_counter() - self._start
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+        ))
+        _tracing -= 1
+        if _tracing == 0:
+            tracemalloc.stop()
+
+        top = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "created": self.created,
+            "duration_ms": round(duration * 1000, 1),
+            "cpu_ms": round((time.process_time() - self._cpu_start) * 1000, 1),
+            "samples": self._sampler.samples,
+            "interval_ms": settings.profiling_interval_ms,
+            "spans": self.spans,
+            "memory_peak_kb": round(peak / 1024, 1),
+            "top_allocations": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count
+                }
+                for stat in top
+            ],
+            "stacks": dict(self._sampler.stacks.most_common())
+        }
+
+
+def record_span(name: str, start: float, duration: float):
+    """Attach a timed section (e.g. a pipeline stage) to the request's
+    profile; a no-op when the request isn't profiled."""
+    profile = _active.get()
+    if profile is not None:
+        profile.spans.append({
+            "name": name,
+            "offset_ms": round((start - profile._start) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1)
+        })
+
+
+def configure(enabled: bool, sample_rate: Optional[float] = None):
+    _state["enabled"] = enabled
+    if sample_rate is not None:
+        _state["sample_rate"] = min(max(sample_rate, 0.0), 1.0)
+    logger.info(f"Profiling {'on' if enabled else 'off'} (sample rate {_state['sample_rate']})")
+
+
+def status() -> dict:
+    return {
+        **_state,
+        "buffer": _profiles.maxlen,
+        "profiles": [
+            {key: profile[key] for key in ("id", "method", "path", "status", "created", "duration_ms", "cpu_ms", "memory_peak_kb")}
+            for profile in reversed(_profiles)
+        ]
+    }
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    return next((profile for profile in _profiles if profile["id"] == profile_id), None)
+
+
+def collapsed(profile: dict) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
+
+
+def _authorized(headers: list) -> bool:
+    """A request asks for a profile with ``X-Profile: 1`` plus the admin
+    token; without a configured ADMIN_TOKEN the header is ignored."""
+    if not settings.admin_token:
+        return False
+    values = dict(headers)
+    if values.get(b"x-profile") not in (b"1", b"true"):
+        return False
+    return values.get(b"x-admin-token", b"").decode() == settings.admin_token
+
+
+def _asks_for_profile(headers: list) -> bool:
+    # Cheap scan first: unprofiled requests shouldn't pay for building a dict
+    for name, _ in headers:
+        if name == b"x-profile":
+            return _authorized(headers)
+    return False
+
+
+class ProfilingMiddleware:
+    """Profile a sample of HTTP requests, or ones sent with ``X-Profile: 1``.
+
+    Pure ASGI, so streamed responses are profiled until their last byte.
+    Profiled responses carry an ``X-Profile-Id`` header; the profile is
+    downloadable from /admin/profiles/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+        response = {"status": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _active.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _active.reset(token)
+            result = profile.finish(response["status"])
+            _profiles.append(result)
+            logger.info(f"Profiled {profile.method} {profile.path}: {result['duration_ms']}ms, {result['samples']} samples, peak {result['memory_peak_kb']}KB (id {profile.id})")
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        if _state["enabled"] and random.random() < _state["sample_rate"]:
+            return True
+        return _asks_for_profile(scope["headers"])
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import deque
+
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_breakers = {}
+
+
+class CircuitOpenError(Exception):
+    """The provider's breaker is open; skip it without calling."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit open for {name}")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker over a sliding window of recent calls.
+
+    Opens when, over at least ``min_calls`` calls, the failure rate reaches
+    ``failure_rate`` or the share of calls slower than ``slow_call_seconds``
+    reaches ``slow_rate``. After ``open_seconds`` it lets ``half_open_probes``
+    calls through; one success closes it again, one failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1
+    ):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self._calls = deque(maxlen=window)  # (failed, slow)
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self.probes < self.half_open_probes:
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, duration: float):
+        if self.state == HALF_OPEN:
+            self.probes = max(0, self.probes - 1)
+            self._transition(CLOSED if success and duration < self.slow_call_seconds else OPEN)
+            return
+
+        self._calls.append((not success, duration >= self.slow_call_seconds))
+        if self.state == CLOSED and len(self._calls) >= self.min_calls:
+            failures = sum(failed for failed, _ in self._calls) / len(self._calls)
+            slow = sum(slow for _, slow in self._calls) / len(self._calls)
+            if failures >= self.failure_rate or slow >= self.slow_rate:
+                self._transition(OPEN)
+
+    def reset(self):
+        self._transition(CLOSED)
+
+    def stats(self) -> dict:
+        calls = self._calls
+        return {
+            "state": self.state,
+            "calls": len(calls),
+            "failure_rate": round(sum(f for f, _ in calls) / len(calls), 3) if calls else 0.0,
+            "slow_rate": round(sum(s for _, s in calls) / len(calls), 3) if calls else 0.0,
+            "slow_call_seconds": self.slow_call_seconds,
+            "rejected": self.rejected,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.state == OPEN else 0.0
+        }
+
+    async def call(self, fn, *args, timeout: float = None, ignore: tuple = ()):
+        """Run ``fn(*args)`` through the breaker with an optional timeout.
+
+        Exceptions in ``ignore`` (e.g. our own backpressure) pass through
+        without counting against the provider.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(*args), timeout)
+        except BaseException as e:
+            # A cancelled call (e.g. a hedging loser) says nothing about the provider
+            if isinstance(e, (asyncio.CancelledError, *ignore)):
+                self.release()
+            else:
+                self.record(False, time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome."""
+        if self.state == HALF_OPEN:
+            self.probes = max(0, self.probes - 1)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.probes = 0
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        else:
+            self._calls.clear()
+
+
+def get_breaker(name: str, slow_call_seconds: float = 10.0) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(
+            name,
+            slow_call_seconds=slow_call_seconds,
+            window=settings.breaker_window,
+            min_calls=settings.breaker_min_calls,
+            failure_rate=settings.breaker_failure_rate,
+            slow_rate=settings.breaker_slow_rate,
+            open_seconds=settings.breaker_open_seconds,
+            half_open_probes=settings.breaker_half_open_probes
+        )
+    return breaker
+
+
+def available(names: list, prefix: str) -> list:
+    """Names whose breaker would let a call through right now, in order.
+
+    Doesn't claim a half-open probe slot; ``allow`` is checked again at call
+    time.
+    """
+    result = []
+    for name in names:
+        breaker = _breakers.get(f"{prefix}:{name}")
+        if breaker is None or breaker.state != OPEN or time.monotonic() - breaker.opened_at >= breaker.open_seconds:
+            result.append(name)
+    return result
+
+
+def breaker_stats() -> dict:
+    return {name: breaker.stats() for name, breaker in sorted(_breakers.items())}
+
+
+def reset_breaker(name: str) -> bool:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        return False
+    breaker.reset()
+    return True
@@ -0,0 +1,47 @@
+import re
+
+# End of sentence: terminal punctuation (optionally closed by a quote or
+# bracket) followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
+# Words, numbers and single punctuation marks - roughly what a BPE tokenizer splits on
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "vs.", "etc.", "e.g.", "i.e."}
+
+
+class SentenceSegmenter:
+    """Cut a token stream into finished sentences as soon as they end.
+
+    Fragments shorter than ``min_chars`` are held back and merged with the
+    next sentence, and common abbreviations like "Dr." never end one.
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> list:
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            last_word = candidate.rsplit(None, 1)[-1].lower() if candidate else ""
+            if len(candidate) >= self.min_chars and last_word not in _ABBREVIATIONS:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        tail, self._buffer = self._buffer.strip(), ""
+        return tail
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate for Llama-style BPE vocabularies.
+
+    Counts words, numbers and punctuation, with long words costing one extra
+    token per 6 characters. Not exact, but close enough on English prose
+    to enforce a prompt budget without shipping a tokenizer.
+    """
+    return sum(1 + (len(piece) - 1) // 6 for piece in _TOKEN_PIECES.findall(text))